@@ -1,17 +1,57 @@
 """
 Module containing the Flask app for the Authority Contribution Scraper
 """
+import csv
+import hashlib
+import json
 import logging
 import os
+import tempfile
+import threading
+import time
+import typing
+from datetime import date
+from io import StringIO
 
-from flask import Flask, send_file
+from flask import Flask, Response, abort, request
 from flask import jsonify
 from flask_caching import Cache
 
-from authority import loader
-from authority.report import Report
+if typing.TYPE_CHECKING:
+    from authority.report import Report
 
-cache = Cache(config={"CACHE_TYPE": "SimpleCache"})
+cache = Cache(
+    config={
+        "CACHE_TYPE": os.getenv("CACHE_TYPE", "FileSystemCache"),
+        "CACHE_DIR": os.getenv(
+            "CACHE_DIR", os.path.join(tempfile.gettempdir(), "authority-cache")
+        ),
+        "CACHE_REDIS_URL": os.getenv("CACHE_REDIS_URL"),
+        "CACHE_DEFAULT_TIMEOUT": int(os.getenv("CACHE_DEFAULT_TIMEOUT", "604800")),
+    }
+)
+
+#: the number of seconds the data version is cached in this process
+_DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "30"))
+_data_version: tuple[float, str] = (0.0, "")
+_data_version_lock = threading.Lock()
+
+#: the unit selections of which the reports are regenerated after new contributions are loaded
+_PREWARM_UNITS = [[]] + [
+    [unit] for unit in sorted(filter(None, os.getenv("PREWARM_UNITS", "").split(",")))
+]
+_prewarm_lock = threading.Lock()
+_prewarm_running = False
+_prewarm_dirty = False
+
+#: the media types of the graph formats
+_IMAGE_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+#: the query method of the :obj:`Report` of the reports, by name
+_REPORTS = {
+    "contributions-per-month": "contributions_per_month",
+    "authors": "authors",
+}
 
 app = Flask(__name__)
 cache.init_app(app)
@@ -27,19 +67,270 @@ def scrape():
     Scrapes authority contributions from authoritative sources (i.e. blog, XKE app) and stores the
     results in BigQuery.
     """
-    return jsonify(loader.main())
+    from authority import loader
+
+    return jsonify(loader.main(on_loaded=prewarm_in_background))
+
+
+@app.route("/reconcile")
+def reconcile():
+    """
+    Adds the authors of all contributions that are not a contributor yet. Runs
+    periodically to catch the authors missed by the incremental sync of /scrape.
+    """
+    from authority.model.contributor import Synchronizer
+
+    Synchronizer().reconcile()
+    prewarm_in_background()
+    return jsonify({"status": "ok"})
+
+
+def prewarm_in_background():
+    """
+    Starts regenerating the cached reports in a background thread, off the request
+    path. If they are already being regenerated, they are marked dirty and the running
+    thread regenerates them once more when it finishes.
+    """
+    global _prewarm_running, _prewarm_dirty
+    with _prewarm_lock:
+        _prewarm_dirty = True
+        if _prewarm_running:
+            logging.info("reports are being regenerated, regenerating them again afterwards")
+            return
+        _prewarm_running = True
+    threading.Thread(target=_prewarm_while_dirty, name="prewarm", daemon=True).start()
+
+
+def _prewarm_while_dirty():
+    """
+    Regenerates the cached reports until they are no longer marked dirty
+    """
+    global _prewarm_running, _prewarm_dirty
+    while True:
+        with _prewarm_lock:
+            if not _prewarm_dirty:
+                _prewarm_running = False
+                return
+            _prewarm_dirty = False
+        _prewarm()
+
+
+def _prewarm():
+    """
+    Regenerates the report data and the graph of the default period for all units and
+    for each of the units in `PREWARM_UNITS`, for the new data version
+    """
+    global _data_version
+    try:
+        with _data_version_lock:
+            _data_version = (0.0, "")
+        with app.app_context():
+            for units in _PREWARM_UNITS:
+                for name in _REPORTS:
+                    _report_data(name, units, None, None)
+                key = _graph_key(units, None, None, False, "png")
+                _graph(key, units, None, None, False, "png")
+        logging.info("regenerated the reports of %d unit selections", len(_PREWARM_UNITS))
+    except Exception as exception:
+        logging.error("failed to regenerate the reports, %s", exception)
+
+
+def data_version() -> str:
+    """
+    Returns the version of the reported data, looked up at most once every
+    `DATA_VERSION_TTL` seconds
+    """
+    global _data_version
+    with _data_version_lock:
+        expires, version = _data_version
+        if time.monotonic() >= expires:
+            version = _report(units=[]).data_version()
+            _data_version = (time.monotonic() + _DATA_VERSION_TTL, version)
+        return version
+
+
+def _report(units: list[str], include_bar_labels: bool = False) -> "Report":
+    """
+    Returns a report on `units`. The report module, with BigQuery and matplotlib, is
+    imported on first use, so that it does not slow down the start of the service
+    """
+    from authority.report import Report
+
+    return Report(units, include_bar_labels)
+
+
+def _cache_key(name: str, **parameters) -> str:
+    """
+    Returns the cache key of the report `name` with `parameters` for the current
+    data version, which doubles as its strong ETag
+    """
+    parameters = json.dumps(
+        {"data_version": data_version(), **parameters}, sort_keys=True
+    )
+    return f"{name}/{hashlib.sha256(parameters.encode()).hexdigest()}"
+
+
+def _report_parameters() -> tuple[list[str], typing.Optional[date], typing.Optional[date]]:
+    """
+    Returns the units and the period of the report, as specified by the `unit`, `start`
+    and `end` query parameters
+    """
+    return (
+        sorted(request.args.getlist("unit")),
+        _month_parameter("start"),
+        _month_parameter("end"),
+    )
+
+
+def _month_parameter(name: str) -> typing.Optional[date]:
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value if len(value) > 7 else f"{value}-01")
+    except ValueError:
+        abort(400, f"{name} must be a month as YYYY-MM or a date as YYYY-MM-DD")
+
+
+def _report_data(
+    name: str, units: list[str], start: typing.Optional[date], end: typing.Optional[date]
+) -> list[dict[str, typing.Any]]:
+    """
+    Returns the rows of the report `name`, queried once per data version and shared
+    by all the representations of the report
+    """
+    key = _cache_key(f"data/{name}", units=units, start=str(start), end=str(end))
+    rows = cache.get(key)
+    if rows is None:
+        rows = getattr(_report(units), _REPORTS[name])(start, end)
+        cache.set(key, rows)
+    return rows
+
+
+def _send(body: bytes, mimetype: str, etag: str) -> Response:
+    """
+    Returns the response with `body` and a strong `etag`, which clients must revalidate
+    """
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _not_modified(etag: str) -> Response:
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
 
 
 @app.route("/graph/contributions-per-month")
-@cache.cached(timeout=3600)
 def contributions_per_month():
     """
-    generates a graph of the number of contributions per month in this calendar year.
+    generates a graph of the number of contributions per month, for the units specified
+    by the `unit` query parameters and the months from `start` to `end`, as `format`
+    png (default) or svg. The graph is cached until new contributions are loaded.
     """
-    reporter = Report()
-    image = reporter.get_contributions_per_month()
-    image.seek(0)
-    return send_file(image, mimetype="image/png")
+    units, start, end = _report_parameters()
+    include_bar_labels = request.args.get("labels", "false").lower() == "true"
+    image_format = request.args.get("format", "png")
+    if image_format not in _IMAGE_TYPES:
+        abort(400, f"format must be one of {', '.join(_IMAGE_TYPES)}")
+
+    key = _graph_key(units, start, end, include_bar_labels, image_format)
+    etag = key.rsplit("/", 1)[-1]
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+
+    image = _graph(key, units, start, end, include_bar_labels, image_format)
+    return _send(image, _IMAGE_TYPES[image_format], etag)
+
+
+def _graph_key(
+    units: list[str],
+    start: typing.Optional[date],
+    end: typing.Optional[date],
+    include_bar_labels: bool,
+    image_format: str,
+) -> str:
+    return _cache_key(
+        "graph/contributions-per-month",
+        units=units,
+        start=str(start),
+        end=str(end),
+        labels=include_bar_labels,
+        format=image_format,
+    )
+
+
+def _graph(
+    key: str,
+    units: list[str],
+    start: typing.Optional[date],
+    end: typing.Optional[date],
+    include_bar_labels: bool,
+    image_format: str,
+) -> bytes:
+    """
+    Returns the graph of the contributions per month from the cache, rendered from
+    the cached report data if it is not cached yet
+    """
+    image = cache.get(key)
+    if image is None:
+        rows = _report_data("contributions-per-month", units, start, end)
+        report = _report(units, include_bar_labels)
+        image = report.get_contributions_per_month(image_format, rows).getvalue()
+        cache.set(key, image)
+    return image
+
+
+@app.route("/report/contributions-per-month")
+def report_contributions_per_month():
+    """
+    returns the number of contributions per month and type as `format` json (default)
+    or csv, for the units specified by the `unit` query parameters and the months from
+    `start` to `end`
+    """
+    return _send_report("contributions-per-month")
+
+
+@app.route("/report/authors")
+def report_authors():
+    """
+    returns the number of contributions per author as `format` json (default) or csv,
+    for the units specified by the `unit` query parameters and the months from `start`
+    to `end`
+    """
+    return _send_report("authors")
+
+
+def _send_report(name: str) -> Response:
+    units, start, end = _report_parameters()
+    output_format = request.args.get("format", "json")
+    if output_format not in ("json", "csv"):
+        abort(400, "format must be one of json, csv")
+
+    key = _cache_key(
+        f"report/{name}", units=units, start=str(start), end=str(end), format=output_format
+    )
+    etag = key.rsplit("/", 1)[-1]
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+
+    from authority.report import REPORT_FIELDS
+
+    fields = REPORT_FIELDS[name]
+    rows = [
+        {field: value.isoformat() if isinstance(value, date) else value for field, value in row.items()}
+        for row in _report_data(name, units, start, end)
+    ]
+    if output_format == "csv":
+        body = StringIO()
+        writer = csv.DictWriter(body, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+        return _send(body.getvalue().encode(), "text/csv", etag)
+
+    return _send(json.dumps(rows, separators=(",", ":")).encode(), "application/json", etag)
 
 
 if __name__ == "__main__":
@@ -2,48 +2,63 @@
 XKE attendee scraper
 """
 
+import argparse
 import logging
-from collections import defaultdict
-from datetime import datetime
-from functools import cache
+from datetime import datetime, timedelta
 from typing import Optional
 
-import gcloud_config_helper
-import google
 import pytz
 from google.api_core.retry import Retry
-from google.cloud import exceptions
 from google.cloud import firestore, bigquery
 from google.cloud.bigquery import SchemaField, QueryJob, Table
 
+from authority.state import StateStore
+from authority.util import clients
+from authority.util.schema import add_missing_columns
+
 
 class DinnerRegistrationSynchronizer:
     """
     Dinner Registrations synchronizer
     """
 
-    def __init__(self):
-        if gcloud_config_helper.on_path():
-            credentials, project = gcloud_config_helper.default()
-        else:
-            logging.info("using application default credentials")
-            credentials, project = google.auth.default()
-
+    def __init__(self, batch_size: int = 50):
+        """
+        :param int batch_size: The number of events to write and checkpoint at once
+        """
         ## the scraper reads directly from the XKE next project
-        self.xke_db = firestore.Client(credentials=credentials, project="xke-nxt")
-        self.bigquery = bigquery.Client(credentials=credentials, project=project)
-        self._table_ref = f"{project}.authority.dinner_registrations"
+        self.xke_db = clients.firestore_client("xke-nxt")
+        self.bigquery = clients.bigquery_client()
+        self._table_ref = f"{self.bigquery.project}.authority.dinner_registrations"
         self._schema = [
             SchemaField("date", "DATETIME", mode="REQUIRED"),
             SchemaField("building_id", "STRING", mode="REQUIRED"),
             SchemaField("city", "STRING", mode="REQUIRED"),
             SchemaField("dinner_registrations", "INTEGER", mode="REQUIRED"),
+            SchemaField("event_id", "STRING", mode="NULLABLE"),
         ]
         self.table: Optional[Table] = None
+        self.batch_size = batch_size
+        self.state = StateStore(self.bigquery)
 
-    @cache
-    def get_building(self, build_id: str) -> dict:
-        return self.xke_db.collection("buildings").document(build_id).get().to_dict()
+    def get_buildings(self) -> dict[str, dict]:
+        """
+        returns the city of all buildings by building id, read in a single query
+        """
+        return {
+            building.id: building.to_dict()
+            for building in self.xke_db.collection("buildings")
+            .select(["city"])
+            .stream(retry=Retry())
+        }
+
+    @staticmethod
+    def _count(query: "firestore.Query") -> int:
+        """
+        returns the number of documents matching the `query`, counted by Firestore
+        """
+        result = query.count(alias="count").get(retry=Retry())
+        return int(result[0][0].value)
 
     def _create_table_if_not_exists(self) -> bigquery.Table:
         """
@@ -58,7 +73,7 @@ class DinnerRegistrationSynchronizer:
             exists_ok=True,
         )
         logging.info("table %s already exists.", table.full_table_id)
-        return table
+        return add_missing_columns(self.bigquery, table, self._schema)
 
     def latest(self):
         last_entry: datetime = datetime.fromordinal(1).replace(tzinfo=pytz.utc)
@@ -71,70 +86,191 @@ class DinnerRegistrationSynchronizer:
             return entry[0].replace(tzinfo=pytz.utc) if entry[0] else last_entry
         return last_entry
 
-    def sync(self, since: datetime = None):
+    def sync(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        settle_days: int = 7,
+    ):
+        """
+        counts the dinner registrations of the events between `since` and `until`, and
+        upserts the counts per building. Every event is checkpointed once its counts are
+        written; an event is settled, and skipped by later runs, once it has been
+        synchronized `settle_days` after it took place. Changes to registrations of
+        unsettled events are corrected by the next run, so reruns and runs over disjoint
+        event ranges are safe.
+
+        :param datetime since: Start of the event range, defaults to `settle_days` before
+         the latest registration date synchronized
+        :param datetime until: End of the event range, defaults to today
+        :param int settle_days: The number of days after which the registrations of an
+         event no longer change
+        """
         self.table = self._create_table_if_not_exists()
+        settle_time = timedelta(days=settle_days)
         latest = since if since else self.latest()
+        if not since and latest.year > 1:
+            latest -= settle_time
         today = (
             datetime.now()
             .astimezone(pytz.utc)
             .replace(hour=0, minute=0, second=0, microsecond=0)
         )
+        until = min(until, today) if until else today
         logging.info(
-            "reading new XKE dinner registration from firestore since %s", since
+            "reading XKE dinner registrations from firestore between %s and %s", latest, until
         )
         events = (
             self.xke_db.collection("events")
             .where("startTime", ">", latest)
+            .where("startTime", "<=", until)
             .order_by("startTime")
+            .select(["startTime"])
         )
 
-        registration_count = defaultdict(lambda: defaultdict(int))
-
+        checkpoints = self.state.get_all(prefix="dinner-registrations/")
+        buildings = self.get_buildings()
+        rows = []
+        synced = {}
+        now = datetime.now(tz=pytz.utc)
         for event in events.stream(retry=Retry()):
-            if event.get("startTime") > today:
-                break
-            for dinner_registration_reference in (
-                self.xke_db.collection("events")
-                .document(event.id)
-                .collection("dinner-registrations")
-                .where("status", "==", "Attending")
-                .stream(retry=Retry())
-            ):
-                dinner_registration = dinner_registration_reference.to_dict()
-                if building_id := dinner_registration["buildingId"]:
-                    registration_count[event.get("startTime")][building_id] += 1
-                else:
+            key = f"dinner-registrations/{event.id}"
+            start_time = event.get("startTime")
+            checkpoint = checkpoints.get(key)
+            if checkpoint and datetime.fromisoformat(checkpoint["synced_at"]) >= start_time + settle_time:
+                continue
+
+            counts = self._count_registrations(event, buildings)
+            if not checkpoint or checkpoint["counts"] != counts:
+                rows.extend(
+                    (
+                        start_time,
+                        event.id,
+                        building_id,
+                        buildings.get(building_id, {}).get("city") or "unknown",
+                        count,
+                    )
+                    for building_id, count in counts.items()
+                )
+                rows.append((start_time, event.id, None, None, None))
+            synced[key] = {"synced_at": now.isoformat(), "counts": counts}
+
+            if len(synced) >= self.batch_size:
+                self._merge_rows(rows)
+                self.state.put(synced)
+                rows, synced = [], {}
+
+        self._merge_rows(rows)
+        self.state.put(synced)
+
+    def _count_registrations(
+        self, event: "firestore.DocumentSnapshot", buildings: dict[str, dict]
+    ) -> dict[str, int]:
+        """
+        returns the number of dinner registrations of the event by building id. The
+        registrations of a building that is not in `buildings` are counted as well, and
+        stored with the city "unknown".
+        """
+        registrations = (
+            self.xke_db.collection("events")
+            .document(event.id)
+            .collection("dinner-registrations")
+            .where("status", "==", "Attending")
+        )
+        if not (total := self._count(registrations)):
+            return {}
+
+        counts = {}
+        for building_id in buildings:
+            if count := self._count(registrations.where("buildingId", "==", building_id)):
+                counts[building_id] = count
+
+        if sum(counts.values()) < total:
+            # only the registrations of buildings not in `buildings` are read one by one
+            for registration in registrations.select(["buildingId"]).stream(retry=Retry()):
+                building_id = registration.to_dict().get("buildingId")
+                if not building_id:
                     logging.warning(
-                        "skipping dinner registration, no building %s",
-                        dinner_registration,
+                        "skipping dinner registration %s of event %s, no building",
+                        registration.id,
+                        event.id,
                     )
+                elif building_id not in buildings:
+                    counts[building_id] = counts.get(building_id, 0) + 1
+        return counts
 
-        rows = []
-        for date, building_counts in registration_count.items():
-            for building_id, count in building_counts.items():
-                building = self.get_building(building_id)
-                city = building["city"] if building else "unknown"
-                rows.append((date, building_id, city, count))
+    def _merge_rows(self, rows: list[tuple]):
+        """
+        upserts the registration counts keyed by (event_id, building_id). All existing
+        counts of the events in `rows` that are not in `rows` are removed. A row without a
+        building id only marks its event as synchronized.
 
-        self._insert_rows(rows)
+        Counts written before the event id was stored are keyed by date only; those of
+        the dates in `rows` are replaced.
+        """
+        if not rows:
+            return
+        logging.info(f"merge {len(rows)} rows into {self._table_ref}")
+        dates = bigquery.ArrayQueryParameter(
+            "dates",
+            "DATETIME",
+            sorted({date.astimezone(pytz.utc).replace(tzinfo=None) for date, *_ in rows}),
+        )
+        events = bigquery.ArrayQueryParameter(
+            "events", "STRING", sorted({event_id for _, event_id, *_ in rows})
+        )
+        registrations = bigquery.ArrayQueryParameter(
+            "rows",
+            "STRUCT",
+            [
+                bigquery.StructQueryParameter(
+                    None,
+                    bigquery.ScalarQueryParameter(
+                        "date", "DATETIME", date.astimezone(pytz.utc).replace(tzinfo=None)
+                    ),
+                    bigquery.ScalarQueryParameter("event_id", "STRING", event_id),
+                    bigquery.ScalarQueryParameter("building_id", "STRING", building_id),
+                    bigquery.ScalarQueryParameter("city", "STRING", city),
+                    bigquery.ScalarQueryParameter("dinner_registrations", "INT64", count),
+                )
+                for date, event_id, building_id, city, count in rows
+            ],
+        )
+        job: QueryJob = self.bigquery.query(
+            query=_MERGE_REGISTRATIONS.format(table=self._table_ref),
+            job_config=bigquery.QueryJobConfig(query_parameters=[dates, events, registrations]),
+        )
+        job.result()
 
-    def _insert_rows(self, rows: list[tuple]):
-        try:
-            logging.info(f"insert {len(rows)} rows into {self._table_ref}")
-            result = self.bigquery.insert_rows(table=self.table, rows=rows)
 
-            if result:
-                logging.error("failed to add new rows\n%s", "\n".join(result))
-                raise Exception("failed to add new rows")
-        except exceptions.BadRequest as exception:
-            if exception.errors[0].get("message") != "No rows present in the request.":
-                raise exception
+_MERGE_REGISTRATIONS = """
+        MERGE `{table}` t
+        USING (SELECT * FROM UNNEST(@rows) WHERE building_id IS NOT NULL) s
+        ON t.event_id = s.event_id AND t.building_id = s.building_id
+        WHEN MATCHED THEN
+            UPDATE SET date = s.date, city = s.city, dinner_registrations = s.dinner_registrations
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (date, building_id, city, dinner_registrations, event_id)
+            VALUES (s.date, s.building_id, s.city, s.dinner_registrations, s.event_id)
+        WHEN NOT MATCHED BY SOURCE AND t.event_id IN UNNEST(@events) THEN
+            DELETE
+        WHEN NOT MATCHED BY SOURCE AND t.event_id IS NULL AND t.date IN UNNEST(@dates) THEN
+            DELETE
+"""
 
 
 def main():
+    parser = argparse.ArgumentParser(description="synchronize XKE dinner registrations")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="start of the event range")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="end of the event range")
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.INFO)
     synchronizer = DinnerRegistrationSynchronizer()
-    synchronizer.sync()
+    synchronizer.sync(
+        since=args.since.astimezone(pytz.utc) if args.since else None,
+        until=args.until.astimezone(pytz.utc) if args.until else None,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+"""
+Module containing the UserDirectory, a local index of the MS Graph user directory
+"""
+import dataclasses
+import gzip
+import json
+import logging
+import os
+import threading
+import typing
+from pathlib import Path
+
+import requests
+
+from authority.model.user import User
+from authority.ms_graph_api import MSGraphAPI
+
+_instance: "UserDirectory" = None
+_instance_lock = threading.Lock()
+
+_FIELDS = tuple(field.name for field in dataclasses.fields(User))
+
+
+class UserDirectory:
+    """
+    Local copy of the users in the MS Graph directory, indexed by display name, mail and
+    id. It is seeded once from `/users/delta` and kept fresh with the delta link returned,
+    so every refresh only transfers the users changed since the previous one.
+
+    The directory is stored on disk as gzipped JSON, with every user as a row of the
+    :obj:`User` fields, at `USER_DIRECTORY_PATH` (default
+    `~/.cache/authority/directory.json.gz`). On Cloud Run the path is on a mounted
+    Cloud Storage bucket, so the directory and its delta link survive cold starts
+    instead of being seeded again from scratch.
+    """
+
+    def __init__(self, ms_graph_api: MSGraphAPI, path: typing.Optional[str] = None):
+        """
+        :param MSGraphAPI ms_graph_api: The API to read the directory from
+        :param str path: The path of the file to store the directory in
+        """
+        self.ms_graph_api = ms_graph_api
+        self.path = Path(
+            path
+            or os.getenv("USER_DIRECTORY_PATH", "~/.cache/authority/directory.json.gz")
+        ).expanduser()
+        self.delta_link: typing.Optional[str] = None
+        self._users: dict[str, User] = {}
+        self._by_display_name: dict[str, User] = {}
+        self._by_mail: dict[str, User] = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @property
+    def users(self) -> "typing.Iterable[User]":
+        """
+        All users in the directory
+        """
+        return self._users.values()
+
+    def load(self):
+        """
+        Reads the directory from disk, if it was stored before
+        """
+        if not self.path.exists():
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            stored = json.load(file)
+        if stored.get("fields") != list(_FIELDS):
+            logging.info("ignoring user directory %s in an old format", self.path)
+            return
+        self.delta_link = stored["delta_link"]
+        self._users = {row[0]: User(*row) for row in stored["users"]}
+        self._reindex()
+
+    def save(self):
+        """
+        Writes the directory to disk
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        with gzip.open(temporary, "wt", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "fields": list(_FIELDS),
+                    "delta_link": self.delta_link,
+                    "users": [dataclasses.astuple(user) for user in self._users.values()],
+                },
+                file,
+                separators=(",", ":"),
+            )
+        temporary.replace(self.path)
+
+    def refresh(self):
+        """
+        Applies the changes in the MS Graph directory since the previous refresh
+        """
+        try:
+            changes, delta_link = self.ms_graph_api.get_users_delta(self.delta_link)
+        except requests.exceptions.HTTPError as exception:
+            if not self.delta_link or exception.response.status_code != 410:
+                raise exception
+            logging.info("user directory delta link expired, reading all users")
+            self._users = {}
+            changes, delta_link = self.ms_graph_api.get_users_delta()
+
+        self.delta_link = delta_link
+        for change in changes:
+            if "@removed" in change:
+                self._users.pop(change["id"], None)
+                continue
+            current = self._users.get(change["id"])
+            values = dataclasses.asdict(current) if current else dict.fromkeys(_FIELDS)
+            values.update(
+                (field, change[_graph_name(field)])
+                for field in _FIELDS
+                if _graph_name(field) in change
+            )
+            self._users[change["id"]] = User(**values)
+        logging.info(
+            "applied %d changes to the user directory of %d users", len(changes), len(self._users)
+        )
+        self._reindex()
+
+    def _reindex(self):
+        self._by_display_name = {}
+        self._by_mail = {}
+        for user in self._users.values():
+            if user.display_name:
+                self._by_display_name.setdefault(user.display_name.casefold(), user)
+            if user.mail:
+                self._by_mail[user.mail.casefold()] = user
+
+    def get_user_by_display_name(self, display_name: str) -> typing.Optional[User]:
+        """
+        Find a user by their display name, ignoring case
+
+        :param str display_name: The display_name of the user to find
+
+        :return: A user if found
+        :rtype: :obj:`User`
+        """
+        return self._by_display_name.get(display_name.strip().casefold())
+
+    def get_user_by_id(self, user_id: str) -> typing.Optional[User]:
+        """
+        Lookup a user by their ID or email address
+
+        :param str user_id: ID or email address of the user to lookup
+
+        :return: A user if found
+        :rtype: :obj:`User`
+        """
+        return self._users.get(user_id) or self._by_mail.get(user_id.casefold())
+
+    @staticmethod
+    def get_instance() -> "UserDirectory":
+        """
+        Returns the directory of this process, loaded from disk and refreshed once
+        """
+        global _instance
+        with _instance_lock:
+            if not _instance:
+                directory = UserDirectory(MSGraphAPI.get_instance())
+                directory.load()
+                directory.refresh()
+                directory.save()
+                _instance = directory
+        return _instance
+
+
+def _graph_name(field: str) -> str:
+    """
+    Returns the MS Graph property name of a :obj:`User` field
+    """
+    head, *tail = field.split("_")
+    return head + "".join(part.capitalize() for part in tail)
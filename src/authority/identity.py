@@ -0,0 +1,133 @@
+"""
+Module containing the AuthorResolver, which assigns a stable identity to the authors
+of contributions
+"""
+import logging
+import threading
+import typing
+
+from google.cloud import bigquery, exceptions
+
+from authority.util.name_index import NameIndex, normalize_name
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+
+def author_key(name: str) -> str:
+    """
+    Returns the author id of a canonical name: the normalized name, with dashes
+    between the name parts
+
+    **Use:**
+
+        >>> author_key("Martín van  Pérez")
+        'martin-van-perez'
+    """
+    return "-".join(normalize_name(name).split()) or name.strip().casefold()
+
+
+class AuthorResolver:
+    """
+    Resolves the author of a contribution to an `author_id`, so that contributions and
+    contributors can be joined on a single key. An author is resolved, in order, as:
+
+    - the id of the contributor with exactly the same normalized name or GitHub handle,
+      which may be an alias of another contributor;
+    - no id, when the name is only a variant of the name of a contributor, as found by
+      the :obj:`NameIndex`. Such authors are logged for review and resolved once a
+      contributor alias with their exact name is added;
+    - the :func:`author_key` of the name itself, for an author not seen before.
+
+    The result only depends on the contributors table, not on the order in which the
+    authors are resolved, so every resolver of the same table assigns the same ids.
+    """
+
+    def __init__(
+        self,
+        client: bigquery.Client,
+        table_name: str = "authority.contributors",
+    ):
+        """
+        :param bigquery.Client client: The BigQuery client to read the contributors with
+        :param str table_name: The name of the contributors table
+        """
+        self.client = client
+        self._table_ref = f"{self.client.project}.{table_name}"
+        self._ids: dict[str, typing.Optional[str]] = {}
+        self._index: NameIndex[str] = NameIndex(max_distance=0)
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            columns = {field.name for field in self.client.get_table(self._table_ref).schema}
+        except exceptions.NotFound:
+            columns = set()
+
+        contributors = []
+        if columns:
+            # the columns are added by the Synchronizer, which may not have run yet
+            handle = "`github-handle`" if "github-handle" in columns else "NULL"
+            author_id = "author_id" if "author_id" in columns else "NULL"
+            job = self.client.query(
+                f"SELECT author, {handle} AS handle, {author_id} AS author_id "
+                f"FROM `{self._table_ref}` "
+                f"ORDER BY author_id IS NULL, author_id, author"
+            )
+            contributors = [
+                (row.get("author"), row.get("handle"), row.get("author_id"))
+                for row in job.result()
+            ]
+
+        for author, handle, author_id in contributors:
+            author_id = author_id if author_id else author_key(author)
+            self._ids.setdefault(_exact_key(author), author_id)
+            if handle:
+                self._ids.setdefault(_exact_key(handle), author_id)
+            self._index.add(author, author_id)
+
+        logging.info("loaded %d author names and handles", len(self._ids))
+
+    def resolve(self, author: str) -> typing.Optional[str]:
+        """
+        Returns the author id of `author`, or None if it is only a variant of the name of
+        another author
+
+        :param str author: The name or GitHub handle of the author
+
+        :return: The author id
+        :rtype: str
+        """
+        key = _exact_key(author)
+        with self._lock:
+            if key in self._ids:
+                return self._ids[key]
+
+            variant_of = self._index.lookup(author)
+            if variant_of and variant_of != author_key(author):
+                logging.warning(
+                    "leaving the author id of %s empty for review, it resembles %s",
+                    author,
+                    variant_of,
+                )
+                author_id = None
+            else:
+                author_id = author_key(author)
+            self._ids[key] = author_id
+            return author_id
+
+    def resolve_all(
+        self, authors: "collections.abc.Iterable[str]"
+    ) -> dict[str, typing.Optional[str]]:
+        """
+        Returns the author id of each of the `authors`
+        """
+        return {author: self.resolve(author) for author in authors}
+
+
+def _exact_key(name: str) -> str:
+    """
+    Returns the key of an exact match of a name or GitHub handle
+    """
+    return normalize_name(name) or name.strip().casefold()
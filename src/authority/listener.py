@@ -0,0 +1,220 @@
+"""
+Module containing the XkeListener, a long-running alternative to polling the XKE
+sessions through /scrape
+"""
+import logging
+import os
+import functools
+import threading
+import typing
+from datetime import date, datetime
+
+import pytz
+
+from authority.rollup import MonthlyRollup
+from authority.sink import Sink
+from authority.sources.xke import XkeSource
+
+if typing.TYPE_CHECKING:
+    from google.cloud import firestore
+    from google.cloud.firestore_v1.watch import DocumentChange
+
+    from authority.model.contribution import Contribution
+
+
+class XkeListener:
+    """
+    Listens to changes of the public XKE sessions using a Firestore snapshot listener
+    and writes the resulting contributions in micro-batches to the sink.
+
+    A session is loaded once it has started, in the first flush after its start time,
+    exactly as the :obj:`XkeSource` would have done. Sessions that are changed or removed
+    before they start are updated or dropped accordingly.
+
+    The listener and the hourly :obj:`XkeSource` may both run, as they share the
+    watermark of the sink: each only loads sessions that started after the latest XKE
+    contribution in the sink, so a session is owned by whichever loads it first. Every
+    flush reads the watermark again and drops the sessions the source already loaded.
+
+    After every flush the monthly rollup of the months loaded is updated, which changes
+    the data version, so the reports include the sessions loaded by the listener.
+
+    The listener honours `FIRESTORE_EMULATOR_HOST`, so it can be run against the
+    Firestore emulator. The collection group query on `startTime` requires a single
+    field collection group index on `sessions-public.startTime`.
+    """
+
+    def __init__(
+        self, sink: "Sink", flush_interval: float = 10.0, batch_size: int = 500
+    ):
+        """
+        :param Sink sink: The sink to load contributions in to
+        :param float flush_interval: The number of seconds between two micro-batches
+        :param int batch_size: The maximum number of sessions in a micro-batch
+        """
+        self.sink = sink
+        self.source = XkeSource(sink)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: dict[str, list["Contribution"]] = {}
+        self._loaded: dict[str, datetime] = {}
+        self._watermark = datetime.fromordinal(1).replace(tzinfo=pytz.utc)
+        self._months: set[date] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _on_snapshot(
+        self,
+        _: list["firestore.DocumentSnapshot"],
+        changes: list["DocumentChange"],
+        __: datetime,
+    ):
+        with self._lock:
+            for change in changes:
+                session = change.document
+                key = session.reference.path
+                if key in self._loaded:
+                    logging.debug("ignoring change of loaded session %s", key)
+                    continue
+
+                if change.type.name == "REMOVED":
+                    self._pending.pop(key, None)
+                    continue
+
+                contributions = list(
+                    self.source.create_contributions(
+                        event=session.reference.parent.parent, session=session
+                    )
+                )
+                if contributions and contributions[0].date <= self._watermark:
+                    logging.debug("ignoring change of loaded session %s", key)
+                    self._pending.pop(key, None)
+                    continue
+                self._pending[key] = contributions
+
+    def _latest_entry(self) -> datetime:
+        return self.sink.latest_entry(
+            type=self.source.contribution_type, scraper_id=self.source.scraper_id()
+        )
+
+    def flush(self):
+        """
+        Loads the contributions of all pending sessions that have started into the sink
+        and updates the rollup of their months
+        """
+        now = datetime.now(tz=pytz.utc)
+        with self._lock:
+            ready = sorted(
+                (
+                    key
+                    for key, contributions in self._pending.items()
+                    if contributions and contributions[0].date < now
+                ),
+                key=lambda key: self._pending[key][0].date,
+            )[: self.batch_size]
+        if not ready:
+            self._update_rollup()
+            return
+
+        watermark = self._latest_entry()
+        with self._lock:
+            self._watermark = max(self._watermark, watermark)
+            contributions = sorted(
+                (
+                    contribution
+                    for key in ready
+                    for contribution in self._pending[key]
+                    if contribution.date > self._watermark
+                ),
+                key=lambda contribution: contribution.date,
+            )
+
+        if contributions:
+            logging.info(
+                "loading %d contributions of %d sessions", len(contributions), len(ready)
+            )
+            self.sink.load(iter(contributions))
+            self._months.update(contribution.date.date() for contribution in contributions)
+
+        with self._lock:
+            for key in ready:
+                if pending := self._pending.pop(key, None):
+                    self._loaded[key] = pending[0].date
+            if contributions:
+                self._watermark = max(self._watermark, contributions[-1].date)
+            self._loaded = {
+                key: start_time
+                for key, start_time in self._loaded.items()
+                if start_time >= self._watermark
+            }
+
+        self._update_rollup()
+
+    @functools.cached_property
+    def rollup(self) -> MonthlyRollup:
+        """
+        The monthly rollup of the reports
+        """
+        return MonthlyRollup(self.sink.client)
+
+    def _update_rollup(self):
+        """
+        Updates the rollup of the months loaded. On failure, the months are updated
+        again after the next flush.
+        """
+        if not self._months:
+            return
+        try:
+            self.rollup.update(self._months)
+            self._months = set()
+        except Exception as exception:
+            logging.error(
+                "failed to update the rollup of %d months, %s", len(self._months), exception
+            )
+
+    def stop(self):
+        """
+        Stops the listener after the next flush
+        """
+        self._stopped.set()
+
+    def run(self):
+        """
+        Listens to session changes and flushes them every `flush_interval` seconds
+        until stopped
+        """
+        latest = self._latest_entry()
+        with self._lock:
+            self._watermark = latest
+        logging.info("listening to XKE sessions in firestore since %s", latest)
+
+        sessions = self.source.xke_db.collection_group("sessions-public").where(
+            "startTime", ">", latest
+        )
+        watch = sessions.on_snapshot(self._on_snapshot)
+        try:
+            while not self._stopped.wait(self.flush_interval):
+                self.flush()
+        finally:
+            watch.unsubscribe()
+            self.flush()
+
+
+def main():
+    """
+    Runs the XKE listener until interrupted
+    """
+    listener = XkeListener(
+        Sink(), flush_interval=float(os.getenv("LISTENER_FLUSH_INTERVAL", "10"))
+    )
+    try:
+        listener.run()
+    except KeyboardInterrupt:
+        logging.info("stopped listening to XKE sessions")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO"), format="%(levelname)s: %(message)s"
+    )
+    main()
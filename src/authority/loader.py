@@ -8,8 +8,11 @@ import sys
 import traceback
 import typing
 
+from authority.model.contributor import Synchronizer
+from authority.rollup import MonthlyRollup
 from authority.sink import Sink
 from authority.sources.factory import AuthoritySourceFactory
+from authority.util.lazy_env import prefetch_secrets
 
 if typing.TYPE_CHECKING:
     from authority.sources.base_ import AuthoritySource
@@ -41,13 +44,41 @@ class Loader:
             except Exception as exception:
                 traceback.print_exception(*sys.exc_info())
                 last_exception = exception
+        # the rollup is updated even if the contributors failed to sync, so that the
+        # contributions of this run are reported on
+        for step in (self._sync_contributors, self._update_rollup):
+            try:
+                step()
+            except Exception as exception:
+                traceback.print_exception(*sys.exc_info())
+                last_exception = exception
         if last_exception:
             raise last_exception
         return results
 
+    def _sync_contributors(self):
+        """
+        Adds the authors of the contributions loaded in this run that are not a
+        contributor yet
+        """
+        if not self.sink.authors:
+            return
+        logging.info("synchronizing %d authors with the contributors", len(self.sink.authors))
+        Synchronizer().sync(authors=self.sink.authors)
+
+    def _update_rollup(self):
+        """
+        Recomputes the monthly rollup of the months that contributions were loaded for
+        in this run
+        """
+        if not self.sink.months:
+            return
+        MonthlyRollup(self.sink.client).update(self.sink.months)
+
     def _process_source(self, source: "AuthoritySource"):
         logging.info("loading from source %s", source.name)
         self.sink.load(source.feed)
+        source.commit()
         result = {"name": source.name, "count": source.count}
         if source.count:
             logging.info(
@@ -58,15 +89,25 @@ class Loader:
         return result
 
 
-def main():
+def main(on_loaded: typing.Optional[typing.Callable[[], None]] = None):
     """
     Retrieves all contributions, writes them to the sink and returns a summary
+
+    :param typing.Callable on_loaded: Called after the run if new contributions were
+     loaded, even if some of the sources failed
     """
     sink = Sink()
-    sources = tuple(source(sink) for source in AuthoritySourceFactory.get_all_sources())
+    source_classes = AuthoritySourceFactory.get_all_sources()
+    # the sources declare their secrets on import, read them all at once
+    prefetch_secrets()
+    sources = tuple(source(sink) for source in source_classes)
 
     loader = Loader(sink, sources)
-    return loader.run()
+    try:
+        return loader.run()
+    finally:
+        if on_loaded and sink.months:
+            on_loaded()
 
 
 if __name__ == "__main__":
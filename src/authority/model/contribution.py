@@ -16,6 +16,7 @@ Schema = [
     SchemaField("type", "STRING", mode="REQUIRED"),
     SchemaField("scraper_id", "STRING"),
     SchemaField("url", "STRING"),
+    SchemaField("author_id", "STRING"),
 ]
 
 
@@ -31,6 +32,7 @@ class Contribution:
     type: str
     scraper_id: str
     url: typing.Optional[str] = None
+    author_id: typing.Optional[str] = None
 
     @property
     def as_tuple(self) -> tuple[typing.Any, ...]:
@@ -2,24 +2,42 @@
 Module containing the Contributors model
 """
 import dataclasses
+import functools
 import logging
+import time
 import typing
-import google
-from gcloud_config_helper import gcloud_config_helper
 
 import pytz
 from google.cloud import bigquery, exceptions
 from google.cloud.bigquery import SchemaField
 
 from authority.ms_graph_api import MSGraphAPI
-from authority.util.unit import get_unit_by_display_name
+from authority.directory import UserDirectory
+from authority.identity import AuthorResolver
+from authority.rollup import MonthlyRollup
+from authority.util.name_index import NameIndex
+from authority.util import clients
+from authority.util.concurrency import ordered_map
+from authority.util.schema import add_missing_columns
+from authority.util.unit import (
+    build_unit_index,
+    get_unit_by_display_name,
+    get_units_by_display_names,
+)
+
+if typing.TYPE_CHECKING:
+    import collections.abc
 
 Schema = [
     SchemaField("author", "STRING", mode="REQUIRED"),
     SchemaField("unit", "STRING", mode="NULLABLE"),
-    SchemaField("github_handle", "STRING", mode="NULLABLE")
+    SchemaField("github-handle", "STRING", mode="NULLABLE"),
+    SchemaField("author_id", "STRING", mode="NULLABLE"),
 ]
 
+#: the number of authors resolved in a single lookup, the MS Graph $batch size
+_RESOLVE_SIZE = 20
+
 
 @dataclasses.dataclass
 class Contributor:
@@ -29,13 +47,14 @@ class Contributor:
     author: str
     unit: str
     github_handle: typing.Optional[str]
+    author_id: typing.Optional[str] = None
 
     @property
     def as_tuple(self) -> tuple[typing.Any, ...]:
         """
         Returns a contributor as a tuple
         """
-        return tuple(getattr(self, field.name) for field in Schema)
+        return tuple(getattr(self, field.name.replace("-", "_")) for field in Schema)
 
     @property
     def is_valid(self) -> bool:
@@ -56,13 +75,16 @@ class Synchronizer:
     """
     sync the contributors from new contributions. Adds the unit too.
     """
-    def __init__(self):
-        if gcloud_config_helper.on_path():
-            credentials, project = gcloud_config_helper.default()
-        else:
-            credentials, project = google.auth.default()
-
-        self.client = bigquery.Client(credentials=credentials, project=project)
+    def __init__(self, max_workers: int = 4, max_attempts: int = 3, insert_size: int = 500):
+        """
+        :param int max_workers: The maximum number of concurrent unit lookups
+        :param int max_attempts: The number of attempts to resolve the unit of an author
+        :param int insert_size: The maximum number of contributors inserted at once
+        """
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.insert_size = insert_size
+        self.client = clients.bigquery_client()
         self._table_ref = f"{self.client.project}.authority.contributors"
         self.table = self._create_table_if_not_exists()
         self._ms_graph_api = MSGraphAPI.get_instance()
@@ -76,41 +98,247 @@ class Synchronizer:
             exists_ok=True,
         )
         logging.info("table %s already exists.", table.full_table_id)
-        return table
+        return add_missing_columns(self.client, table, Schema)
 
-    def sync(self):
+    def sync(self, authors: "typing.Optional[collections.abc.Iterable[str]]" = None):
         """
         add new contributors and determine the associated unit
+
+        :param collections.abc.Iterable authors: The authors to add if they are not a
+         contributor yet. If not specified, all authors of contributions are reconciled
+         with the contributors.
         """
-        try:
-            result = self.client.insert_rows(
-                table=self.table, rows=map(lambda c: c.as_tuple, self.new_contributors())
-            )
-            if result:
-                logging.error("failed to add new contributors")
-                logging.error("%s", "\n".join(result))
-                exit(1)
+        rows: list[tuple] = []
+        for contributor in self.new_contributors(authors):
+            rows.append(contributor.as_tuple)
+            if len(rows) >= self.insert_size:
+                self._insert_rows(rows)
+                rows = []
+        self._insert_rows(rows)
+
+    def reconcile(self):
+        """
+        add the authors of all contributions that are not a contributor yet and rebuild
+        the monthly rollup. This reads the whole contributions table and is meant to run
+        periodically, to catch the authors that were missed by the incremental sync and
+        the changes in the units of the contributors. Contributors and contributions
+        without an author id are assigned one.
+        """
+        self.sync(authors=None)
+        self.backfill_author_ids()
+        MonthlyRollup(self.client).rebuild()
+
+    def backfill_author_ids(self):
+        """
+        assign an author id to the contributors and contributions without one. A
+        contributor is assigned the author id already stored on its contributions, if any.
+        Authors that are only a variant of the name of another author are left without one
+        """
+        self.client.query(_COPY_AUTHOR_IDS.format(project=self.client.project)).result()
 
+        job = self.client.query(_AUTHORS_WITHOUT_ID.format(project=self.client.project))
+        authors = [row.get("author") for row in job.result()]
+        if not authors:
+            return
+
+        resolved = {
+            author: author_id
+            for author, author_id in self.author_resolver.resolve_all(authors).items()
+            if author_id
+        }
+        if not resolved:
+            return
+
+        logging.info("assigning author ids to %d authors", len(resolved))
+        author_ids = bigquery.ArrayQueryParameter(
+            "author_ids",
+            "STRUCT",
+            [
+                bigquery.StructQueryParameter(
+                    None,
+                    bigquery.ScalarQueryParameter("author", "STRING", author),
+                    bigquery.ScalarQueryParameter("author_id", "STRING", author_id),
+                )
+                for author, author_id in resolved.items()
+            ],
+        )
+        job = self.client.query(
+            _BACKFILL_AUTHOR_IDS.format(project=self.client.project),
+            job_config=bigquery.QueryJobConfig(query_parameters=[author_ids]),
+        )
+        job.result()
+
+    @functools.cached_property
+    def author_resolver(self) -> AuthorResolver:
+        """
+        The resolver of the author ids of new contributors, configured like the one of
+        the :obj:`Sink <authority.sink.Sink>`
+        """
+        return AuthorResolver(self.client)
+
+    def _stored_author_ids(self, authors: list[str]) -> dict[str, str]:
+        """
+        Returns the author id stored on the contributions of each of the `authors`
+        """
+        job = self.client.query(
+            _STORED_AUTHOR_IDS.format(project=self.client.project),
+            job_config=bigquery.QueryJobConfig(
+                query_parameters=[bigquery.ArrayQueryParameter("authors", "STRING", authors)]
+            ),
+        )
+        return {row.get("author"): row.get("author_id") for row in job.result()}
+
+    @functools.cached_property
+    def known_authors(self) -> set[str]:
+        """
+        The authors that are a contributor
+        """
+        job = self.client.query(f"SELECT DISTINCT author FROM `{self._table_ref}`")
+        return {row.get("author") for row in job.result()}
+
+    def _insert_rows(self, rows: list[tuple]):
+        """
+        inserts the rows, retrying the rows that failed once. Rows that fail again are
+        logged and skipped; they are retried by the next sync.
+        """
+        try:
+            for attempt in range(2):
+                if not rows:
+                    return
+                logging.info(f"insert {len(rows)} contributors into {self._table_ref}")
+                result = self.client.insert_rows(table=self.table, rows=rows)
+                failed = {error["index"] for error in result}
+                if failed and attempt == 0:
+                    logging.warning("retrying %d contributors that failed to insert", len(failed))
+                rows = [row for index, row in enumerate(rows) if index in failed]
+            for row in rows:
+                logging.error("failed to add new contributor %s", row)
         except exceptions.BadRequest as exception:
             if exception.errors[0].get("message") != "No rows present in the request.":
                 raise exception
 
-    def new_contributors(self):
-        new_contributors = """
-            select DISTINCT c.author
-            from  authority.contributions c 
-            left outer join authority.contributors a 
-            on a.author = c.author 
-            where a.author is null
+    @functools.cached_property
+    def unit_index(self) -> NameIndex[str]:
+        """
+        An index of units by the names of the users in the directory and the contributors
+        with a known unit, to resolve variants of their names without MS Graph lookups
+        """
+        job = self.client.query(
+            f"SELECT author, unit FROM `{self._table_ref}` WHERE unit IS NOT NULL AND unit != 'other'"
+        )
+        return build_unit_index(
+            UserDirectory.get_instance(),
+            ((row.get("author"), row.get("unit")) for row in job.result()),
+        )
+
+    def new_contributors(
+        self, authors: "typing.Optional[collections.abc.Iterable[str]]" = None
+    ) -> "collections.abc.Generator[Contributor, None, None]":
+        """
+        returns the `authors` that are not a contributor yet, with their unit. If no
+        authors are specified, the new authors are determined from all contributions.
+        """
+        if authors is None:
+            new_contributors = """
+                select DISTINCT c.author
+                from  authority.contributions c 
+                left outer join authority.contributors a 
+                on a.author = c.author 
+                where a.author is null
+            """
+            job = self.client.query(new_contributors)
+            authors = [row.get("author") for row in job.result()]
+        else:
+            authors = sorted(set(authors) - self.known_authors)
+        if not authors:
+            return
+
+        # contributors get the author id their contributions were loaded with
+        stored_author_ids = self._stored_author_ids(authors)
+        # build the index once, before the concurrent lookups use it
+        _ = self.unit_index
+        chunks = [
+            authors[offset : offset + _RESOLVE_SIZE]
+            for offset in range(0, len(authors), _RESOLVE_SIZE)
+        ]
+        for units in ordered_map(self._resolve_units, chunks, self.max_workers):
+            for author, unit in units.items():
+                logging.info("adding %s of unit %s", author, unit)
+                self.known_authors.add(author)
+                yield Contributor(
+                    author=author,
+                    unit=unit,
+                    github_handle=None,
+                    author_id=stored_author_ids.get(author)
+                    or self.author_resolver.resolve(author),
+                )
+
+    def _resolve_units(self, authors: list[str]) -> dict[str, str]:
         """
-        job = self.client.query(new_contributors)
-        for row in job.result():
-            author = row.get("author")
-            unit = get_unit_by_display_name(self._ms_graph_api, author)
-            logging.info("adding %s of unit %s", author, unit)
-            yield Contributor(author=author, unit=unit, github_handle=None)
+        Returns the units of the authors. When the batch lookup fails, the authors are
+        looked up one by one, with retries. Authors that still fail are left out.
+        """
+        try:
+            return get_units_by_display_names(
+                self._ms_graph_api, authors, index=self.unit_index
+            )
+        except Exception as exception:
+            logging.warning("failed to resolve units of %d authors, %s", len(authors), exception)
+
+        units = {}
+        for author in authors:
+            for attempt in range(self.max_attempts):
+                try:
+                    units[author] = get_unit_by_display_name(
+                        self._ms_graph_api, author, index=self.unit_index
+                    )
+                    break
+                except Exception as exception:
+                    if attempt == self.max_attempts - 1:
+                        logging.error("skipping %s, failed to resolve unit: %s", author, exception)
+                    else:
+                        time.sleep(2**attempt)
+        return units
+
+
+_STORED_AUTHOR_IDS = """
+    SELECT author, MIN(author_id) AS author_id
+    FROM `{project}.authority.contributions`
+    WHERE author IN UNNEST(@authors) AND author_id IS NOT NULL
+    GROUP BY author
+"""
+
+_COPY_AUTHOR_IDS = """
+    UPDATE `{project}.authority.contributors` a
+    SET author_id = c.author_id
+    FROM (
+        SELECT author, MIN(author_id) AS author_id
+        FROM `{project}.authority.contributions`
+        WHERE author_id IS NOT NULL
+        GROUP BY author
+    ) c
+    WHERE a.author = c.author AND a.author_id IS NULL
+"""
+
+_AUTHORS_WITHOUT_ID = """
+    SELECT author FROM `{project}.authority.contributors` WHERE author_id IS NULL
+    UNION DISTINCT
+    SELECT author FROM `{project}.authority.contributions` WHERE author_id IS NULL
+"""
+
+_BACKFILL_AUTHOR_IDS = """
+    UPDATE `{project}.authority.contributors` a
+    SET author_id = i.author_id
+    FROM UNNEST(@author_ids) i
+    WHERE a.author = i.author AND a.author_id IS NULL;
+
+    UPDATE `{project}.authority.contributions` c
+    SET author_id = i.author_id
+    FROM UNNEST(@author_ids) i
+    WHERE c.author = i.author AND c.author_id IS NULL;
+"""
 
 
 if __name__ == "__main__":
     syncer = Synchronizer()
-    syncer.sync()
+    syncer.reconcile()
@@ -3,17 +3,41 @@ Module containing the MSGraphAPI wrapper
 """
 import os
 import functools
+import logging
+import threading
+import time
 import typing
+from urllib.parse import urlencode
 
 import requests
-from azure.identity import ClientSecretCredential
+import requests.adapters
 
 from authority.model.user import User
-from authority.util.google_secrets import SecretManager
-from authority.util.lazy_env import lazy_env
+from authority.util.lazy_env import declare_secret, lazy_env, prefetch_secrets
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+    from azure.core.credentials import AccessToken
 
 _instance: "MSGraphAPI" = None
 
+_CLIENT_ID = declare_secret(
+    "MS_GRAPH_CLIENT_ID", "authority-contribution-scraper-ms-graph-client-id"
+)
+_TENANT_ID = declare_secret(
+    "MS_GRAPH_TENANT_ID", "authority-contribution-scraper-ms-graph-tenant-id"
+)
+_CLIENT_SECRET = declare_secret(
+    "MS_GRAPH_CLIENT_SECRET", "authority-contribution-scraper-ms-graph-client-secret"
+)
+
+#: the maximum number of requests in a single MS Graph $batch request
+_BATCH_SIZE = 20
+
+#: the number of seconds before expiry at which the access token is renewed
+_TOKEN_REFRESH_MARGIN = 300
+
 
 class MSGraphAPI:
     """
@@ -26,11 +50,19 @@ class MSGraphAPI:
         :param str client_id: The azure application client ID
         :param str client_secret: The azure application client secret
         """
+        from azure.identity import ClientSecretCredential
+
         self.client_credential = ClientSecretCredential(
             tenant_id=tenant_id,
             client_id=client_id,
             client_secret=client_secret,
         )
+        self.session = requests.Session()
+        self.session.mount(
+            "https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=16)
+        )
+        self._access_token: typing.Optional["AccessToken"] = None
+        self._access_token_lock = threading.Lock()
 
     @functools.lru_cache(maxsize=1000)
     def get_user_by_display_name(self, display_name: str) -> typing.Optional[User]:
@@ -42,26 +74,13 @@ class MSGraphAPI:
         :return: A user if found
         :rtype: :obj:`User`
         """
-        query_params = {
-            "$select": ",".join(
-                ["displayName", "id", "mail", "department", "companyName"]
-            ),
-            "$search": f'"displayName:{display_name}"',
-            "$top": 1,
-            "$orderby": ",".join(["displayName"]),
-        }
-        headers = {
-            "ConsistencyLevel": "eventual",
-        }
-
         request = self._prepare_request(
             method="get",
             resource_path="users",
-            query_params=query_params,
-            headers=headers,
+            query_params=self._search_query_params(display_name),
+            headers={"ConsistencyLevel": "eventual"},
         )
-        with requests.Session() as session:
-            response = session.send(request=request)
+        response = self._send(request)
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as exception:
@@ -72,6 +91,132 @@ class MSGraphAPI:
 
         return User.from_dict(**users["value"][0]) if users.get("value") else None
 
+    def get_users_by_display_name(
+        self, display_names: "collections.abc.Iterable[str]", max_retries: int = 5
+    ) -> dict[str, typing.Optional[User]]:
+        """
+        Find users using the MS Graph API by their display names. Up to 20 lookups are
+        sent in a single $batch request; throttled lookups are retried up to
+        `max_retries` times. Names that are still throttled are logged and left out.
+
+        :param collections.abc.Iterable display_names: The display names of the users to find
+        :param int max_retries: The maximum number of retries of a throttled lookup
+
+        :return: The user found, if any, by display name
+        :rtype: :obj:`dict`
+        """
+        names = list(dict.fromkeys(display_names))
+        users: dict[str, typing.Optional[User]] = {}
+        for offset in range(0, len(names), _BATCH_SIZE):
+            pending = names[offset : offset + _BATCH_SIZE]
+            for attempt in range(max_retries + 1):
+                if not pending:
+                    break
+                responses = self._batch(
+                    [
+                        {
+                            "id": str(index),
+                            "method": "GET",
+                            "url": f"/users?{urlencode(self._search_query_params(name))}",
+                            "headers": {"ConsistencyLevel": "eventual"},
+                        }
+                        for index, name in enumerate(pending)
+                    ]
+                )
+                throttled, retry_after = [], 0
+                for response in responses:
+                    name = pending[int(response["id"])]
+                    status = response["status"]
+                    if status == 200:
+                        body = response.get("body", {})
+                        users[name] = (
+                            User.from_dict(**body["value"][0]) if body.get("value") else None
+                        )
+                    elif status == 400:
+                        users[name] = None
+                    elif status == 429 or status >= 500:
+                        throttled.append(name)
+                        retry_after = max(
+                            retry_after,
+                            int(response.get("headers", {}).get("Retry-After", 1)),
+                        )
+                    else:
+                        raise requests.exceptions.HTTPError(
+                            f"{status} looking up user {name}: {response.get('body')}"
+                        )
+                if throttled and attempt == max_retries:
+                    logging.error(
+                        "skipping %d user lookups still throttled after %d retries: %s",
+                        len(throttled),
+                        max_retries,
+                        ", ".join(throttled),
+                    )
+                elif throttled:
+                    logging.info(
+                        "%d user lookups throttled, retrying in %s seconds",
+                        len(throttled),
+                        retry_after,
+                    )
+                    time.sleep(retry_after)
+                pending = throttled
+        return users
+
+    def _batch(self, batch_requests: list[dict]) -> list[dict]:
+        """
+        Sends the requests in a single MS Graph $batch request and returns the responses
+        """
+        request = self._prepare_request(
+            method="post",
+            resource_path="$batch",
+            query_params={},
+        )
+        request.prepare_body(data=None, files=None, json={"requests": batch_requests})
+        response = self._send(request)
+        response.raise_for_status()
+        return response.json()["responses"]
+
+    def get_users_delta(
+        self, delta_link: typing.Optional[str] = None
+    ) -> tuple[list[dict], str]:
+        """
+        Reads the changes to the users in the directory since the `delta_link` was issued,
+        or all users if no `delta_link` is given. Removed users have a `@removed` property.
+
+        :param str delta_link: The delta link returned by a previous call
+
+        :return: The changed users and the delta link for the next call
+        :rtype: :obj:`tuple`
+        """
+        users = []
+        next_link = delta_link or "users/delta"
+        query_params = (
+            {}
+            if delta_link
+            else {"$select": ",".join(["displayName", "id", "mail", "department", "companyName"])}
+        )
+        while True:
+            request = self._prepare_request(
+                method="get", resource_path=next_link, query_params=query_params
+            )
+            response = self._send(request)
+            response.raise_for_status()
+            page = response.json()
+            users.extend(page.get("value", []))
+            if "@odata.deltaLink" in page:
+                return users, page["@odata.deltaLink"]
+            next_link, query_params = page["@odata.nextLink"], {}
+
+    @staticmethod
+    def _search_query_params(display_name: str) -> dict:
+        return {
+            "$select": ",".join(
+                ["displayName", "id", "mail", "department", "companyName"]
+            ),
+            "$search": f'"displayName:{display_name}"',
+            "$top": 1,
+            "$orderby": ",".join(["displayName"]),
+        }
+
     @functools.lru_cache(maxsize=1000)
     def get_user_by_id(self, user_id: str) -> typing.Optional[User]:
         """
@@ -93,8 +238,7 @@ class MSGraphAPI:
             resource_path=f"users/{user_id}",
             query_params=query_params,
         )
-        with requests.Session() as session:
-            response = session.send(request=request)
+        response = self._send(request)
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as exception:
@@ -113,12 +257,13 @@ class MSGraphAPI:
     ):
         if headers is None:
             headers = {}
-        default_scope = "https://graph.microsoft.com/.default"
-        access_token = self.client_credential.get_token(default_scope).token
+        access_token = self._get_access_token()
         request = requests.PreparedRequest()
         request.prepare_method(method=method)
         request.prepare_url(
-            url=f"https://graph.microsoft.com/v1.0/{resource_path}",
+            url=resource_path
+            if resource_path.startswith("https://")
+            else f"https://graph.microsoft.com/v1.0/{resource_path}",
             params=query_params,
         )
         request.prepare_headers(
@@ -129,29 +274,46 @@ class MSGraphAPI:
         )
         return request
 
+    def _get_access_token(self) -> str:
+        """
+        Returns the cached access token, acquiring a new one shortly before it expires
+        """
+        with self._access_token_lock:
+            if (
+                not self._access_token
+                or self._access_token.expires_on - _TOKEN_REFRESH_MARGIN < time.time()
+            ):
+                default_scope = "https://graph.microsoft.com/.default"
+                self._access_token = self.client_credential.get_token(default_scope)
+            return self._access_token.token
+
+    def _send(
+        self, request: requests.PreparedRequest, max_retries: int = 5
+    ) -> requests.Response:
+        """
+        Sends the request over the pooled session. Throttled requests are retried after
+        the Retry-After period the service asks for.
+        """
+        for attempt in range(max_retries + 1):
+            response = self.session.send(request=request)
+            if response.status_code not in (429, 503) or attempt == max_retries:
+                return response
+            retry_after = int(response.headers.get("Retry-After", 2**attempt))
+            logging.info(
+                "MS Graph request throttled, retrying in %s seconds", retry_after
+            )
+            time.sleep(retry_after)
+        return response
+
     @staticmethod
     def get_instance():
         global _instance
         if not _instance:
+            prefetch_secrets([_CLIENT_ID, _TENANT_ID, _CLIENT_SECRET])
             _instance = MSGraphAPI(
-                client_id=lazy_env(
-                    key="MS_GRAPH_CLIENT_ID",
-                    default=lambda: SecretManager().get_secret(
-                        "authority-contribution-scraper-ms-graph-client-id"
-                    ),
-                ),
-                tenant_id=lazy_env(
-                    key="MS_GRAPH_TENANT_ID",
-                    default=lambda: SecretManager().get_secret(
-                        "authority-contribution-scraper-ms-graph-tenant-id"
-                    ),
-                ),
-                client_secret=lazy_env(
-                    key="MS_GRAPH_CLIENT_SECRET",
-                    default=lambda: SecretManager().get_secret(
-                        "authority-contribution-scraper-ms-graph-client-secret"
-                    ),
-                ),
+                client_id=lazy_env(key=_CLIENT_ID),
+                tenant_id=lazy_env(key=_TENANT_ID),
+                client_secret=lazy_env(key=_CLIENT_SECRET),
             )
         return _instance
 
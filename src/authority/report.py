@@ -1,18 +1,27 @@
 """
 Module containing the Report class
 """
+import collections
+import concurrent.futures
+import contextlib
+import csv
 import logging
+import multiprocessing
 import os
 import subprocess
 import tempfile
-from io import BytesIO
+import threading
+import typing
+import zipfile
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
 
-import gcloud_config_helper
-import google
-import numpy
+import pytz
 from google.cloud import bigquery
-from matplotlib import pyplot
-from authority.model.contributor import Synchronizer
+from authority.rollup import MonthlyRollup
+from authority.util import clients
+from authority.util.concurrency import ordered_map
 
 
 class Report:
@@ -21,124 +30,350 @@ class Report:
     """
 
     def __init__(self, units: [str], include_bar_labels:bool=False):
-        if gcloud_config_helper.on_path():
-            credentials, project = gcloud_config_helper.default()
-        else:
-            logging.info("using application default credentials")
-            credentials, project = google.auth.default()
-        self.client = bigquery.Client(credentials=credentials, project=project)
+        self.client = clients.bigquery_client()
         self.units = units
         self.include_bar_labels = include_bar_labels
 
-    def get_contributions_per_month(self) -> BytesIO:
+    def data_version(self) -> str:
         """
-        Writes a plot of the contributions per month for the current calendar year
-        to a BytesIO stream
+        Returns the version of the data reported on, which changes whenever new
+        contributions are loaded
+        """
+        return MonthlyRollup.data_version(self.client)
 
-        :return: A BytesIO stream containing an image
-        :rtype: :obj:`BytesIO`
+    def contributions_per_month(
+        self, start: typing.Optional[date] = None, end: typing.Optional[date] = None
+    ) -> list[dict[str, typing.Any]]:
         """
-        x_labels = []
-        blogs = []
-        xkes = []
-        pull_requests = []
-
-        units = ', '.join(map(lambda x: f'"{x}"', self.units)) if self.units else '""'
-        select = _CONTRIBUTIONS_PER_MONTH.format(units=units)
-        job = self.client.query(select)
-        for row in job.result():
-            x_labels.append(row.get("maand").strftime("%B\n%Y"))
-            blogs.append(row.get("blog"))
-            xkes.append(row.get("xke"))
-            pull_requests.append(row.get("pullrequest"))
-
-        blogs = list(map(lambda c: c if c else 0, blogs))
-        xkes = list(map(lambda c: c if c else 0, xkes))
-        pull_requests = list(map(lambda c: c if c else 0, pull_requests))
-        x_axis = numpy.arange(len(x_labels))
-        pyplot.rcParams["figure.figsize"] = (10, 5)
-        bars = [
-            pyplot.bar(x_axis - 0.2, blogs, 0.4, label="Blogs"),
-            pyplot.bar(x_axis + 0.2, xkes, 0.4, label="XKEs"),
-            pyplot.bar(x_axis + 0.4, pull_requests, 0.4, label="Github PRs"),
+        Returns the number of contributions per month and type, from the month of `start`
+        up to and including the month of `end`. Defaults to the last twelve full months.
+
+        :return: A row per month with the fields of :data:`CONTRIBUTIONS_PER_MONTH_FIELDS`
+        :rtype: :obj:`list`
+        """
+        default_start, default_end = _last_months(12)
+        job = self.client.query(
+            _CONTRIBUTIONS_PER_MONTH,
+            job_config=self._job_config(start or default_start, end or default_end),
+        )
+        return [
+            {field: row.get(field) or 0 for field in CONTRIBUTIONS_PER_MONTH_FIELDS}
+            for row in job.result()
         ]
 
-        if self.include_bar_labels:
-            for bar in bars:
-               pyplot.bar_label(bar)
+    def authors(
+        self, start: typing.Optional[date] = None, end: typing.Optional[date] = None
+    ) -> list[dict[str, typing.Any]]:
+        """
+        Returns the number of contributions per author, from the month of `start` up to
+        and including the month of `end`. Defaults to the last full month.
+
+        :return: A row per author with the fields of :data:`AUTHORS_FIELDS`
+        :rtype: :obj:`list`
+        """
+        default_start, default_end = _last_months(1)
+        job = self.client.query(
+            _AUTHORS,
+            job_config=self._job_config(start or default_start, end or default_end),
+        )
+        return [{field: row.get(field) for field in AUTHORS_FIELDS} for row in job.result()]
+
+    def batch(
+        self, start: typing.Optional[date] = None, end: typing.Optional[date] = None
+    ) -> dict[str, dict[str, list[dict[str, typing.Any]]]]:
+        """
+        Returns the contributions per month and the authors of the last month for each
+        unit, or for each of the units of this report if specified, from a single query
+        that is read once
+
+        :return: The `contributions-per-month` and `authors` rows, by unit
+        :rtype: :obj:`dict`
+        """
+        default_start, default_end = _last_months(12)
+        start, end = (start or default_start).replace(day=1), (end or default_end).replace(day=1)
+        job = self.client.query(_BATCH, job_config=self._job_config(start, end))
+
+        months: dict[str, dict[date, dict[str, typing.Any]]] = collections.defaultdict(dict)
+        authors: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        for row in job.result():
+            unit, month, author = row.get("unit"), row.get("month"), row.get("author")
+            type_ = row.get("type")
+            if author is None:
+                counts = months[unit].setdefault(
+                    month, dict.fromkeys(CONTRIBUTIONS_PER_MONTH_FIELDS, 0) | {"month": month}
+                )
+                field = _BATCH_TYPES.get(type_)
+                if field:
+                    counts[field] += row.get("contributions")
+            elif month == end and type_ != "attendees":
+                authors[unit][author] += row.get("contributions")
+
+        return {
+            unit: {
+                "contributions-per-month": [months[unit][month] for month in sorted(months[unit])],
+                "authors": [
+                    {"author": author, "contributions": count}
+                    for author, count in sorted(authors[unit].items(), key=lambda a: (-a[1], a[0]))
+                ],
+            }
+            for unit in sorted(months.keys() | authors.keys())
+        }
+
+    def write_batch(
+        self,
+        path: str,
+        start: typing.Optional[date] = None,
+        end: typing.Optional[date] = None,
+        max_workers: int = 4,
+    ) -> list[str]:
+        """
+        Writes the chart of the contributions per month and the authors of each unit, as
+        returned by :meth:`batch`, to the directory `path`, or to a zip file if `path`
+        ends with `.zip`. The charts are rendered concurrently.
+
+        :return: The names of the files written
+        :rtype: :obj:`list`
+        """
+        reports = self.batch(start, end)
+
+        def render_unit(unit: str) -> list[tuple[str, bytes]]:
+            chart = self.get_contributions_per_month(
+                rows=reports[unit]["contributions-per-month"]
+            )
+            authors = StringIO()
+            writer = csv.DictWriter(authors, fieldnames=AUTHORS_FIELDS)
+            writer.writeheader()
+            writer.writerows(reports[unit]["authors"])
+            return [
+                (f"{unit}/contributions-per-month.png", chart.getvalue()),
+                (f"{unit}/authors.csv", authors.getvalue().encode()),
+            ]
 
-        pyplot.xticks(x_axis, x_labels)
-        pyplot.xticks(rotation=90)
-        pyplot.title("Contributions per month")
-        pyplot.legend()
-        pyplot.tight_layout()
+        names = []
+        with contextlib.ExitStack() as stack:
+            if path.endswith(".zip"):
+                archive = stack.enter_context(zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED))
+                write = archive.writestr
+            else:
+                def write(name: str, content: bytes):
+                    target = Path(path, name)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    target.write_bytes(content)
 
-        image = BytesIO()
-        pyplot.savefig(image, format="png")
-        pyplot.close()
-        image.seek(0)
-        return image
+            for files in ordered_map(render_unit, reports, max_workers):
+                for name, content in files:
+                    write(name, content)
+                    names.append(name)
+        return names
+
+    def _job_config(self, start: date, end: date) -> bigquery.QueryJobConfig:
+        return bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("start", "DATE", start.replace(day=1)),
+                bigquery.ScalarQueryParameter("end", "DATE", end.replace(day=1)),
+                bigquery.ArrayQueryParameter("units", "STRING", list(self.units)),
+            ]
+        )
+
+    def get_contributions_per_month(
+        self,
+        image_format: str = "png",
+        rows: typing.Optional[list[dict[str, typing.Any]]] = None,
+    ) -> BytesIO:
+        """
+        Writes a plot of the contributions per month to a BytesIO stream
+
+        :param str image_format: The format of the image, i.e. png or svg
+        :param list rows: The contributions per month to plot, as returned by
+         :meth:`contributions_per_month`. Queried if not specified.
+
+        :return: A BytesIO stream containing an image
+        :rtype: :obj:`BytesIO`
+        """
+        rows = self.contributions_per_month() if rows is None else rows
+        return BytesIO(
+            render(
+                render_contributions_per_month,
+                [row["month"].strftime("%B\n%Y") for row in rows],
+                {
+                    "Blogs": [row["blog"] for row in rows],
+                    "XKEs": [row["xke"] for row in rows],
+                    "Github PRs": [row["pullrequest"] for row in rows],
+                },
+                self.include_bar_labels,
+                image_format,
+            )
+        )
 
     def print_authors(self):
         """
         Queries the BigQuery table and prints out the number of contributions per author
         """
-        units = ', '.join(map(lambda x: f'"{x}"', self.units)) if self.units else '""'
-        job = self.client.query(_AUTHORS.format(units=units))
-        authors = [f'{row.get("author")} ({row.get("aantal")})' for row in job.result()]
-        total = sum(map(lambda c: c["aantal"], job.result()))
+        rows = self.authors()
+        authors = [f'{row["author"]} ({row["contributions"]})' for row in rows]
+        total = sum(row["contributions"] for row in rows)
 
         print(
               f'Last month, a grand total of {total} contributions where made by ' + ", ".join(authors).replace(" (1)", ""))
 
 
+def _last_months(count: int) -> tuple[date, date]:
+    """
+    Returns the first days of the first and the last of the `count` full months
+    before the current month
+    """
+    current = datetime.now(tz=pytz.utc).date().replace(day=1)
+    end = (current - timedelta(days=1)).replace(day=1)
+    months = current.year * 12 + current.month - 1 - count
+    return date(months // 12, months % 12 + 1, 1), end
+
+
+#: the offsets of the bars of the series in the contributions per month chart
+_BAR_OFFSETS = (-0.2, 0.2, 0.4)
+
+
+def render_contributions_per_month(
+    x_labels: list[str],
+    series: dict[str, list[int]],
+    include_bar_labels: bool = False,
+    image_format: str = "png",
+) -> bytes:
+    """
+    Renders a bar chart of the contributions per month. The chart is drawn on its own
+    figure and canvas instead of the global pyplot state, so that charts can be rendered
+    concurrently by threads or in another process.
+
+    :param list x_labels: The labels of the months
+    :param dict series: The number of contributions per month, by series label
+    :param bool include_bar_labels: Include the numbers in the bars
+    :param str image_format: The format of the image, i.e. png or svg
+
+    :return: The image
+    :rtype: bytes
+    """
+    # matplotlib is imported on first use, it is not needed for the report data
+    import numpy
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(10, 5))
+    FigureCanvasAgg(figure)
+    axes = figure.subplots()
+
+    x_axis = numpy.arange(len(x_labels))
+    for offset, (label, values) in zip(_BAR_OFFSETS, series.items()):
+        bars = axes.bar(x_axis + offset, values, 0.4, label=label)
+        if include_bar_labels:
+            axes.bar_label(bars)
+
+    axes.set_xticks(x_axis)
+    axes.set_xticklabels(x_labels, rotation=90)
+    axes.set_title("Contributions per month")
+    axes.legend()
+    figure.tight_layout()
+
+    image = BytesIO()
+    figure.savefig(image, format=image_format)
+    return image.getvalue()
+
+
+_pool: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def render(function: typing.Callable[..., bytes], *args) -> bytes:
+    """
+    Calls the render `function` with `args`, in a pool of `REPORT_RENDER_PROCESSES`
+    processes if set, and in the calling thread otherwise
+    """
+    global _pool
+    processes = int(os.getenv("REPORT_RENDER_PROCESSES", "0"))
+    if processes <= 0:
+        return function(*args)
+
+    with _pool_lock:
+        if not _pool:
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+            )
+    return _pool.submit(function, *args).result()
+
+
+#: the fields of the rows returned by :meth:`Report.contributions_per_month`
+CONTRIBUTIONS_PER_MONTH_FIELDS = ("month", "blog", "xke", "pullrequest")
+
+#: the fields of the rows returned by :meth:`Report.authors`
+AUTHORS_FIELDS = ("author", "contributions")
+
+#: the fields of the rows of the reports, by name
+REPORT_FIELDS = {
+    "contributions-per-month": CONTRIBUTIONS_PER_MONTH_FIELDS,
+    "authors": AUTHORS_FIELDS,
+}
+
 _CONTRIBUTIONS_PER_MONTH = """
                SELECT *
                FROM (
-               SELECT DATETIME_TRUNC(date, MONTH) AS maand, type, COUNT(DISTINCT guid) AS aantal,
-               FROM `binxio-mgmt.authority.contributions` c, `binxio-mgmt.authority.contributors` a 
-               WHERE date BETWEEN DATE_SUB(date_trunc(CURRENT_DATE(), month), INTERVAL 12 MONTH) AND date_trunc(CURRENT_DATE(), month) 
-               AND (c.author = a.author OR c.author = a.`github-handle`)
-               AND ('""' = '{units}' or a.unit in ( {units} ))
-               GROUP BY maand, type
+               SELECT month, type, SUM(contributions) AS contributions,
+               FROM `binxio-mgmt.authority.contributions_monthly`
+               WHERE month BETWEEN @start AND @end
+               AND author IS NULL
+               AND ((ARRAY_LENGTH(@units) = 0 AND unit IS NULL) OR unit IN UNNEST(@units))
+               GROUP BY month, type
                ) 
                PIVOT ( 
-                   MAX(aantal)
+                   MAX(contributions)
                    FOR type IN ('xke', 'blog', 'github-pr' AS pullrequest)
                )
-               ORDER BY maand ASC
+               ORDER BY month ASC
+       """
+
+#: the field of the contributions per month of the contribution types
+_BATCH_TYPES = {"blog": "blog", "xke": "xke", "github-pr": "pullrequest"}
+
+_BATCH = """
+               SELECT unit, month, type, author, contributions
+               FROM `binxio-mgmt.authority.contributions_monthly`
+               WHERE month BETWEEN @start AND @end
+               AND unit IS NOT NULL
+               AND (ARRAY_LENGTH(@units) = 0 OR unit IN UNNEST(@units))
        """
 
 _AUTHORS = """
-               SELECT c.author, COUNT(DISTINCT guid) AS aantal,
-               FROM `binxio-mgmt.authority.contributions` c, `binxio-mgmt.authority.contributors` a
-               WHERE date BETWEEN DATE_SUB(DATE_TRUNC(CURRENT_DATE(), MONTH), INTERVAL 1 MONTH) AND 
-               DATE_SUB(DATE_TRUNC(CURRENT_DATE(), MONTH), INTERVAL 0 MONTH)
-               AND (c.author = a.author OR c.author = a.`github-handle`)
-               AND ('""' = '{units}' or a.unit in ({units}))
-               AND (c.type != 'attendees')
-               GROUP BY c.author
-               ORDER BY aantal DESC, author ASC
+               SELECT author, SUM(contributions) AS contributions,
+               FROM `binxio-mgmt.authority.contributions_monthly`
+               WHERE month BETWEEN @start AND @end
+               AND author IS NOT NULL
+               AND (ARRAY_LENGTH(@units) = 0 OR unit IN UNNEST(@units))
+               AND (type != 'attendees')
+               GROUP BY author
+               ORDER BY contributions DESC, author ASC
        """
 
 
 if __name__ == "__main__":
     import argparse
 
+    from authority.model.contributor import Synchronizer
+
     parser = argparse.ArgumentParser(description="report authority contributions")
     parser.add_argument("--unit", default=[], action='append', help="to report on")
     parser.add_argument("--include-bar-labels", action="store_true", help="include numbers in bars")
+    parser.add_argument("--batch", metavar="PATH", help="write a report per unit to a directory or zip file")
     args = parser.parse_args()
 
     logging.basicConfig(
         level=os.getenv("LOG_LEVEL", "INFO"), format="%(levelname)s: %(message)s"
     )
 
-    Synchronizer().sync()
+    Synchronizer().reconcile()
     reporter = Report(args.unit, args.include_bar_labels)
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False, mode="wb") as file:
-        image_stream = reporter.get_contributions_per_month()
-        file.write(image_stream.read())
-        print(file.name)
-        subprocess.run(['/usr/bin/open', file.name])
-    reporter.print_authors()
+    if args.batch:
+        print("\n".join(reporter.write_batch(args.batch)))
+    else:
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False, mode="wb") as file:
+            image_stream = reporter.get_contributions_per_month()
+            file.write(image_stream.read())
+            print(file.name)
+            subprocess.run(['/usr/bin/open', file.name])
+        reporter.print_authors()
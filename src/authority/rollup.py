@@ -0,0 +1,161 @@
+"""
+Module containing the MonthlyRollup class
+"""
+import logging
+import typing
+from datetime import date, datetime
+
+import pytz
+from google.cloud import bigquery
+from google.cloud.bigquery import SchemaField
+
+from authority.util import clients
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+Schema = [
+    SchemaField("month", "DATE", mode="REQUIRED"),
+    SchemaField("unit", "STRING", mode="NULLABLE"),
+    SchemaField("type", "STRING", mode="REQUIRED"),
+    SchemaField("author", "STRING", mode="NULLABLE"),
+    SchemaField("contributions", "INTEGER", mode="REQUIRED"),
+]
+
+#: the state key of the version of the rollup, changed on every update
+DATA_VERSION_KEY = "rollup/version"
+
+
+class MonthlyRollup:
+    """
+    Number of distinct contributions per (month, unit, type, author), maintained
+    incrementally from the contributions and contributors tables for the reports.
+
+    Distinct counts can not be summed over authors or units, as a contribution may
+    have several authors. Rows without an author therefore hold the number of distinct
+    contributions per (month, unit, type), and rows without an author and unit the
+    number per (month, type).
+
+    Contributions are joined with a single row per contributor, on the author id, so
+    that every contribution is counted in one unit only; the unit of an author with
+    several aliases is the first one known other than "other". Contributions without an
+    author id, loaded before it was resolved or left for review, and contributions with
+    an author id that no contributor has, are joined on the name or GitHub handle of the
+    contributor instead.
+
+    Every update changes the data version in the :obj:`StateStore`, under
+    :data:`DATA_VERSION_KEY`, so that caches of the reports can be invalidated.
+    """
+
+    def __init__(
+        self,
+        client: bigquery.Client,
+        table_name: str = "authority.contributions_monthly",
+    ):
+        """
+        :param bigquery.Client client: The BigQuery client to use
+        :param str table_name: The name of the rollup table
+        """
+        self.client = client
+        self._table_ref = f"{self.client.project}.{table_name}"
+        self.table = self._create_table_if_not_exists()
+
+    def _create_table_if_not_exists(self) -> bigquery.Table:
+        """
+        Create a BigQuery table if it doesn't exist
+        """
+        table = self.client.create_table(
+            table=bigquery.Table(table_ref=self._table_ref, schema=Schema),
+            exists_ok=True,
+        )
+        logging.info("table %s already exists.", table.full_table_id)
+        return table
+
+    def update(self, months: "collections.abc.Iterable[date]"):
+        """
+        Recomputes the rollup of the specified months. The whole rollup is built when
+        the table is still empty.
+
+        :param collections.abc.Iterable months: The months with new contributions
+        """
+        months = sorted({month.replace(day=1) for month in months})
+        if not months:
+            return
+        if not self.table.num_rows:
+            self.rebuild()
+            return
+
+        logging.info("updating %s for %d months", self._table_ref, len(months))
+        self._refresh(
+            "month IN UNNEST(@months)",
+            [bigquery.ArrayQueryParameter("months", "DATE", months)],
+        )
+
+    def rebuild(self):
+        """
+        Recomputes the rollup of all months
+        """
+        logging.info("rebuilding %s", self._table_ref)
+        self._refresh("TRUE", [])
+        self.table = self.client.get_table(self._table_ref)
+
+    def _refresh(self, condition: str, query_parameters: list):
+        job = self.client.query(
+            query=_REFRESH.format(
+                rollup=self._table_ref,
+                project=self.client.project,
+                condition=condition,
+            ),
+            job_config=bigquery.QueryJobConfig(query_parameters=query_parameters),
+        )
+        job.result()
+        clients.state_store(self.client.project).put(
+            {DATA_VERSION_KEY: datetime.now(tz=pytz.utc).isoformat()}
+        )
+
+    @staticmethod
+    def data_version(client: bigquery.Client) -> str:
+        """
+        Returns the current version of the rollup, which changes on every update. The
+        state store is shared by the process, so this only runs a query.
+        """
+        return clients.state_store(client.project).get(DATA_VERSION_KEY, "")
+
+
+_REFRESH = """
+        DELETE FROM `{rollup}` WHERE {condition};
+
+        INSERT INTO `{rollup}` (month, unit, type, author, contributions)
+        SELECT month, unit_label AS unit, type_label AS type, author_label AS author, contributions
+        FROM (
+            SELECT DATE(DATETIME_TRUNC(c.date, MONTH)) AS month,
+                   IFNULL(IF(i.author_id IS NOT NULL, i.unit, n.unit), 'other') AS unit_label,
+                   c.type AS type_label,
+                   c.author AS author_label,
+                   COUNT(DISTINCT c.guid) AS contributions
+            FROM `{project}.authority.contributions` c
+            LEFT JOIN (
+                SELECT author_id,
+                       ARRAY_AGG(unit IGNORE NULLS ORDER BY unit = 'other' LIMIT 1)[SAFE_OFFSET(0)] AS unit
+                FROM `{project}.authority.contributors`
+                WHERE author_id IS NOT NULL
+                GROUP BY author_id
+            ) i
+            ON i.author_id = c.author_id
+            LEFT JOIN (
+                SELECT name,
+                       ARRAY_AGG(unit IGNORE NULLS ORDER BY unit = 'other' LIMIT 1)[SAFE_OFFSET(0)] AS unit
+                FROM `{project}.authority.contributors`, UNNEST([author, `github-handle`]) AS name
+                WHERE name IS NOT NULL
+                GROUP BY name
+            ) n
+            ON i.author_id IS NULL AND n.name = c.author
+            WHERE i.author_id IS NOT NULL OR n.name IS NOT NULL
+            GROUP BY GROUPING SETS (
+                (month, unit_label, type_label, author_label),
+                (month, unit_label, type_label),
+                (month, type_label)
+            )
+        )
+        WHERE {condition};
+"""
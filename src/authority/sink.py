@@ -1,20 +1,22 @@
 """
 Module containing the Sink class
 """
+import functools
 import logging
 import os
 import sys
 import typing
-from datetime import datetime
+from datetime import date, datetime
 
-import gcloud_config_helper
-import google
 import pytz
 from google.cloud import bigquery, exceptions
 from google.cloud.bigquery import SqlParameterScalarTypes
 from google.cloud.bigquery.job import QueryJob
 
+from authority.identity import AuthorResolver
 from authority.model.contribution import Contribution, Schema
+from authority.util import clients
+from authority.util.schema import add_missing_columns
 
 if typing.TYPE_CHECKING:
     import collections.abc
@@ -26,14 +28,11 @@ class Sink:
     """
 
     def __init__(self, table_name: str = "authority.contributions"):
-        if gcloud_config_helper.on_path():
-            credentials, project = gcloud_config_helper.default()
-        else:
-            credentials, project = google.auth.default()
-
-        self.client = bigquery.Client(credentials=credentials, project=project)
+        self.client = clients.bigquery_client()
         self._table_ref = f"{self.client.project}.{table_name}"
         self.table = self._create_table_if_not_exists()
+        self.authors: set[str] = set()
+        self.months: set[date] = set()
 
     def _create_table_if_not_exists(self) -> bigquery.Table:
         """
@@ -47,7 +46,23 @@ class Sink:
             exists_ok=True,
         )
         logging.info("table %s already exists.", table.full_table_id)
-        return table
+        return add_missing_columns(self.client, table, Schema)
+
+    @functools.cached_property
+    def author_resolver(self) -> typing.Optional[AuthorResolver]:
+        """
+        The resolver of the author ids of the contributions loaded, built on first use.
+        None if it could not be built; the contributions are then loaded without an
+        author id, which is assigned by the next reconcile.
+        """
+        try:
+            return AuthorResolver(self.client)
+        except Exception as exception:
+            logging.error(
+                "failed to build the author resolver, loading without author ids: %s",
+                exception,
+            )
+            return None
 
     def latest_entry(self, **kwargs) -> datetime:
         """
@@ -93,7 +108,9 @@ class Sink:
         self, contributions: "collections.abc.Generator[Contribution, None, None]"
     ):
         """
-        Loads contributions into the BigQuery table
+        Loads contributions into the BigQuery table, with the author id resolved by the
+        :attr:`author_resolver`, if available. The authors and the months of the contributions loaded
+        are added to :attr:`authors` and :attr:`months`.
 
         :param collections.abc.Generator contributions: The contributions to insert into the
          BigQuery Table
@@ -101,6 +118,8 @@ class Sink:
         try:
             currentDate = None
             rows: [tuple] = []
+            authors: set[str] = set()
+            months: set[date] = set()
             for contribution in contributions:
                 contribution_date = contribution.date.date()
                 if not currentDate:
@@ -108,13 +127,21 @@ class Sink:
 
                 if rows and contribution_date != currentDate:
                     self._insert_rows(rows)
-                    rows = []
+                    self.authors.update(authors)
+                    self.months.update(months)
+                    rows, authors, months = [], set(), set()
                     currentDate = contribution_date
 
+                if not contribution.author_id and self.author_resolver:
+                    contribution.author_id = self.author_resolver.resolve(contribution.author)
                 rows.append(contribution.as_tuple)
+                authors.add(contribution.author)
+                months.add(contribution_date.replace(day=1))
 
             if rows:
                 self._insert_rows(rows)
+                self.authors.update(authors)
+                self.months.update(months)
 
         except exceptions.BadRequest as exception:
             if exception.errors[0].get("message") != "No rows present in the request.":
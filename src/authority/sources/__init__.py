@@ -1,9 +1,4 @@
 """
 Module containing all authority contribution sources.
-Imports all sources to automatically register them to the factory.
+The sources are imported by the factory on first use, which registers them.
 """
-from authority.sources.youtube import YoutubeChannel
-from authority.sources.blog import BlogSource
-from authority.sources.xke import XkeSource
-from authority.sources.article import AuthoritySource
-from authority.sources.github_pull_requests import GithubPullRequests
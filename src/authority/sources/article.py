@@ -2,27 +2,40 @@
 Module containing the articles source class
 """
 import logging
+import re
 import typing
 from datetime import datetime
-from time import mktime
+from email.utils import parsedate_to_datetime
 
-import feedparser
 import pytz
 import requests
-from dateutil.parser import parse as datetime_parse
+from defusedxml import ElementTree
 
 from authority.model.contribution import Contribution
 from authority.sources.base_ import AuthoritySource
+from authority.state import StateStore
 
 if typing.TYPE_CHECKING:
     import collections.abc
 
+_FEED_URL = "https://articles.xebia.com/rss.xml"
+_DC_CREATOR = "{http://purl.org/dc/elements/1.1/}creator"
+
 
 class ArticleSource(AuthoritySource):
     """
     Articles scraper implementation
+
+    The ETag and Last-Modified validators of the feed are kept between runs, so an
+    unchanged feed costs a single 304 response. A changed feed is parsed while it is
+    streamed in, and every item published after the latest entry is loaded.
     """
 
+    def __init__(self, sink):
+        super().__init__(sink)
+        self.state = StateStore(sink.client)
+        self._validators: typing.Optional[dict] = None
+
     @property
     def name(self) -> str:
         return "articles.xebia.com"
@@ -44,17 +57,77 @@ class ArticleSource(AuthoritySource):
     def _feed(self) -> "collections.abc.Generator[Contribution, None, None]":
         latest = self._get_latest_entry()
         now = datetime.now(tz=pytz.utc)
-        logging.info(
-            "reading new blogs from https://articles.xebia.com/rss.xml since %s", latest
-        )
-        feed = feedparser.parse("https://articles.xebia.com/rss.xml", modified=latest)
+        logging.info("reading new blogs from %s since %s", _FEED_URL, latest)
+
+        validators = self.state.get(f"validators/{_FEED_URL}", {})
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        entries = []
+        with requests.get(_FEED_URL, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code == 304:
+                logging.info("%s has not been modified", _FEED_URL)
+                return
+            response.raise_for_status()
+            response.raw.decode_content = True
+
+            for entry, published_date in self._parse_items(response.raw):
+                if published_date > latest or published_date.date() == now.date():
+                    entries.append((entry, published_date))
+
+            self._validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+
+        for entry, published_date in sorted(entries, key=lambda e: e[1]):
+            yield from self._process_article(entry, published_date)
+
+    def commit(self):
+        """
+        Stores the validators of the feed that was loaded
+        """
+        if self._validators:
+            self.state.put({f"validators/{_FEED_URL}": self._validators})
+            self._validators = None
+
+    @staticmethod
+    def _parse_items(
+        stream: typing.BinaryIO,
+    ) -> "collections.abc.Generator[tuple[dict, datetime], None, None]":
+        """
+        Parses the items of an RSS feed one by one while it is read from the stream. An
+        author named by both dc:creator and author is returned once.
+        """
+        for _, element in ElementTree.iterparse(stream, events=("end",)):
+            if element.tag != "item":
+                continue
 
-        for entry in sorted(feed.entries, key=lambda e: e["published_parsed"]):
-            published_date = datetime.fromtimestamp(
-                mktime(entry["published_parsed"]), tz=pytz.utc
+            authors = [creator.text for creator in element.iter(_DC_CREATOR)]
+            if author := element.findtext("author"):
+                # RSS authors are formatted as "email (name)"
+                match = re.search(r"\((.*)\)", author)
+                authors.append(match.group(1) if match else author)
+
+            entry = {
+                "id": element.findtext("guid") or element.findtext("link"),
+                "title": element.findtext("title"),
+                "link": element.findtext("link"),
+                "authors": [
+                    {"name": author}
+                    for author in dict.fromkeys(
+                        author.strip() for author in authors if author and author.strip()
+                    )
+                ],
+            }
+            published_date = parsedate_to_datetime(element.findtext("pubDate")).astimezone(
+                pytz.utc
             )
-            if published_date > latest or published_date.date() == now.date():
-                yield from self._process_article(entry, published_date)
+            element.clear()
+            yield entry, published_date
 
     def _process_article(
         self,
@@ -3,33 +3,66 @@ XKE attendee scraper
 """
 import collections.abc
 import logging
-from datetime import datetime
+import typing
+from datetime import datetime, timedelta
 
-import gcloud_config_helper
-import google
 import pytz
-from google.cloud import firestore
 from google.api_core.retry import Retry
 
 from authority.model.contribution import Contribution
 from authority.sink import Sink
 from authority.sources.base_ import AuthoritySource
+from authority.state import StateStore
+from authority.util import clients
+from authority.util.concurrency import ordered_map
+
+if typing.TYPE_CHECKING:
+    from google.cloud import firestore
+
+#: the state key marking that the watermarks of the subcollections loaded before were seeded
+_SEEDED_KEY = "attendees-watermarks/seeded"
+
+#: the watermark of a subcollection that was read while it had no attendees
+_EMPTY_WATERMARK = datetime.min.replace(tzinfo=pytz.utc)
 
 
 class AttendeeSource(AuthoritySource):
     """
     Attendee scrapers
+
+    Attendees are read incrementally: for every attendee subcollection the latest
+    document `create_time` seen is kept as a watermark, and only attendee documents
+    created after that watermark are turned into contributions, so edits of an attendee
+    do not load it again. Every subcollection read gets a watermark, also when it is
+    still empty. Subcollections of the events of the last `rescan_days` days are
+    revisited on every run, so attendees added to an event after it was scraped are
+    picked up too. As a subcollection can only be read as a whole, every run reads all
+    attendees of that period.
+
+    On the first run with watermarks, marked done in the :obj:`StateStore` under
+    :data:`_SEEDED_KEY`, the subcollections of the sessions that started before the
+    latest attendee loaded were loaded before: their watermarks are seeded without
+    loading their attendees again.
     """
-    def __init__(self, sink: Sink):
-        super().__init__(sink)
-        if gcloud_config_helper.on_path():
-            credentials, _ = gcloud_config_helper.default()
-        else:
-            logging.info("using application default credentials")
-            credentials, _ = google.auth.default()
 
+    #: the only session and attendee fields read, all others are left out of the query projection
+    _SESSION_FIELDS = ["startTime", "title", "slug"]
+    _ATTENDEE_FIELDS = ["name"]
+
+    def __init__(self, sink: Sink, max_workers: int = 8, rescan_days: int = 14):
+        """
+        :param Sink sink: Sink to retrieve the latest entry from
+        :param int max_workers: The maximum number of subcollections read concurrently
+        :param int rescan_days: The number of days to look back for late attendees
+        """
+        super().__init__(sink)
+        self.max_workers = max_workers
+        self.rescan_days = rescan_days
+        self.state = StateStore(sink.client)
+        self._watermarks: dict[str, typing.Any] = {}
+        self._seeding = False
         ## the scraper reads directly from the XKE next project
-        self.xke_db = firestore.Client(credentials=credentials, project="xke-nxt")
+        self.xke_db = clients.firestore_client("xke-nxt")
 
     @property
     def name(self):
@@ -51,54 +84,126 @@ class AttendeeSource(AuthoritySource):
             type=self._contribution_type, scraper_id=self.scraper_id()
         )
 
-        logging.info("reading new XKE session attendees from firestore since %s", latest)
-
         now = datetime.now().astimezone(pytz.utc)
+        since = min(latest, now - timedelta(days=self.rescan_days))
+
+        logging.info("reading new XKE session attendees from firestore since %s", since)
+
+        watermarks = self.state.get_all(prefix="attendees/")
+        self._watermarks = {}
+        self._seeding = not self.state.get(_SEEDED_KEY, False)
+        if self._seeding:
+            logging.info("seeding the watermarks of the attendees loaded before %s", latest)
+
         events = (
             self.xke_db.collection("events")
 
             .where(
                 "startTime",
                 ">=",
-                latest.replace(hour=0, minute=0, second=0, microsecond=0),
+                since.replace(hour=0, minute=0, second=0, microsecond=0),
             )
             .order_by("startTime")
+            .select(["startTime"])
         )
 
-        for event_reference in events.stream(retry=Retry()):
-            for session_reference in (
-                    self.xke_db.collection("events")
-                            .document(event_reference.id)
-                            .collection("sessions-public")
-                            .stream(retry=Retry())
-            ):
-                if session_reference.id.endswith('-protected'):
-                    continue
-
-                session = session_reference.to_dict()
+        sessions = (
+            (event_reference, session_reference)
+            for event_reference, session_references in ordered_map(
+                self._get_sessions, events.stream(retry=Retry()), self.max_workers
+            )
+            for session_reference in session_references
+            if session_reference.get("startTime") < now
+        )
 
-                for attendee_reference in (
-                self.xke_db.collection("events").document(event_reference.id).collection("sessions-private").document(
-                        session_reference.id).collection("attendees").stream(retry=Retry())):
-                    attendee = attendee_reference.to_dict()
+        for event_reference, session_reference, attendee_references in ordered_map(
+            self._get_attendees, sessions, self.max_workers
+        ):
+            key = f"attendees/{event_reference.id}/{session_reference.id}"
+            watermark = (
+                datetime.fromisoformat(watermarks[key]) if key in watermarks else None
+            )
+            latest_create = max(
+                (attendee_reference.create_time for attendee_reference in attendee_references),
+                default=_EMPTY_WATERMARK,
+            )
+            if not watermark or latest_create > watermark:
+                self._watermarks[key] = latest_create.isoformat()
 
-                    date = session.get('startTime')
-                    if date < now:
-                        yield Contribution(
-                            guid=f"{event_reference.id}/{session_reference.id}/{attendee_reference.id}",
-                            title=session.get('title')  ,
-                            author=attendee['name'],
-                            date=session.get('startTime'),
-                            url=f"https://xke.xebia.com/event/{event_reference.id}/{session_reference.id}/{session.get('slug', '')}",
-                            scraper_id=self.scraper_id(),
-                            type=self._contribution_type
-                        )
+            session = session_reference.to_dict()
+            if not watermark and self._seeding and session.get("startTime") <= latest:
+                logging.debug("seeding the watermark of %s, loaded before", key)
+                continue
 
+            for attendee_reference in attendee_references:
+                if watermark and attendee_reference.create_time <= watermark:
+                    continue
+                attendee = attendee_reference.to_dict()
+                yield Contribution(
+                    guid=f"{event_reference.id}/{session_reference.id}/{attendee_reference.id}",
+                    title=session.get('title')  ,
+                    author=attendee['name'],
+                    date=session.get('startTime'),
+                    url=f"https://xke.xebia.com/event/{event_reference.id}/{session_reference.id}/{session.get('slug', '')}",
+                    scraper_id=self.scraper_id(),
+                    type=self._contribution_type
+                )
+
+    def commit(self):
+        """
+        Stores the watermarks of the attendee subcollections read
+        """
+        if self._seeding:
+            self._watermarks[_SEEDED_KEY] = True
+            self._seeding = False
+        self.state.put(self._watermarks)
+        self._watermarks = {}
+
+    def _get_sessions(
+        self, event_reference: "firestore.DocumentSnapshot"
+    ) -> tuple["firestore.DocumentSnapshot", list["firestore.DocumentSnapshot"]]:
+        """
+        Reads the public sessions of an event, ordered by their start time
+        """
+        sessions = []
+        for session_reference in (
+                self.xke_db.collection("events")
+                        .document(event_reference.id)
+                        .collection("sessions-public")
+                        .select(self._SESSION_FIELDS)
+                        .stream(retry=Retry())
+        ):
+            if session_reference.id.endswith('-protected'):
+                continue
+            if not session_reference.get("startTime"):
+                logging.error(
+                    "%s - %s - does not have a startTime field", event_reference.id, session_reference.id
+                )
+                continue
+            sessions.append(session_reference)
+
+        sessions.sort(key=lambda session: session.get("startTime"))
+        return event_reference, sessions
+
+    def _get_attendees(
+        self,
+        event_and_session: tuple["firestore.DocumentSnapshot", "firestore.DocumentSnapshot"],
+    ) -> tuple["firestore.DocumentSnapshot", "firestore.DocumentSnapshot", list["firestore.DocumentSnapshot"]]:
+        """
+        Reads the attendees of a session
+        """
+        event_reference, session_reference = event_and_session
+        attendees = list(
+            self.xke_db.collection("events").document(event_reference.id).collection("sessions-private").document(
+                session_reference.id).collection("attendees").select(self._ATTENDEE_FIELDS).stream(retry=Retry())
+        )
+        return event_reference, session_reference, attendees
 
 if __name__ == "__main__":
     sink = Sink()
     source = AttendeeSource(sink)
     sink.load(source.feed)
+    source.commit()
 
     # from authority.util.test_source import test_source
     # from datetime import datetime
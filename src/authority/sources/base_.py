@@ -4,10 +4,7 @@ Module containing the AuthoritySource base class
 import abc
 import typing
 
-from authority.ms_graph_api import MSGraphAPI
 from authority.sources.factory import AuthoritySourceFactory
-from authority.util.google_secrets import SecretManager
-from authority.util.lazy_env import lazy_env
 
 if typing.TYPE_CHECKING:
     import collections.abc
@@ -59,6 +56,13 @@ class AuthoritySource(abc.ABC):
             self.count = count
             yield contribution
 
+    def commit(self):
+        """
+        Called once the contributions of the feed have been loaded into the sink. Sources
+        that keep state between runs persist it here, so that the state never runs ahead
+        of the contributions actually loaded.
+        """
+
     @property
     @abc.abstractmethod
     def _feed(self) -> "collections.abc.Generator[Contribution, None, None]":
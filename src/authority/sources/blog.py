@@ -16,8 +16,10 @@ from authority.sources.base_ import AuthoritySource
 from typing import Generator
 from functools import cache
 
-from authority.util.google_secrets import SecretManager
-from authority.util.lazy_env import lazy_env
+from authority.util.lazy_env import declare_secret, lazy_env
+
+_WP_USERNAME = declare_secret("WP_USERNAME", "authority-contribution-wp-username")
+_WP_PASSWORD = declare_secret("WP_PASSWORD", "authority-contribution-wp-password")
 
 
 class BlogSource(AuthoritySource):
@@ -29,18 +31,8 @@ class BlogSource(AuthoritySource):
         super().__init__(sink)
         config = configparser.ConfigParser()
         config.read(expanduser("~/.wordpress.ini"))
-        self.username = lazy_env(
-            key="WP_USERNAME",
-            default=lambda: SecretManager().get_secret(
-                "authority-contribution-wp-username"
-            ),
-        )
-        self.password = lazy_env(
-            key="WP_PASSWORD",
-            default=lambda: SecretManager().get_secret(
-                "authority-contribution-wp-password"
-            ),
-        )
+        self.username = lazy_env(key=_WP_USERNAME)
+        self.password = lazy_env(key=_WP_PASSWORD)
 
     @property
     def name(self) -> str:
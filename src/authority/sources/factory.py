@@ -1,6 +1,7 @@
 """
 Module containing the factory for authority contribution sources
 """
+import importlib
 import inspect
 import typing
 
@@ -8,6 +9,16 @@ if typing.TYPE_CHECKING:
     from authority.sources.base_ import AuthoritySource
 
 
+#: the modules of the sources, imported on first use to register the sources
+_SOURCE_MODULES = (
+    "authority.sources.youtube",
+    "authority.sources.blog",
+    "authority.sources.xke",
+    "authority.sources.article",
+    "authority.sources.github_pull_requests",
+)
+
+
 class AuthoritySourceFactory:
     """
     Factory to register and retrieve authority sources from
@@ -35,4 +46,6 @@ class AuthoritySourceFactory:
         :return: A tuple of classes registered to the factory
         :rtype: :obj:`tuple`
         """
+        for module in _SOURCE_MODULES:
+            importlib.import_module(module)
         return tuple(cls.__registered_authority_sources.values())
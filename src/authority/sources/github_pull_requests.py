@@ -14,10 +14,13 @@ from requests import HTTPError
 
 from authority.model.contribution import Contribution
 from authority.sources.base_ import AuthoritySource
-from authority.util.google_secrets import SecretManager
-from authority.util.lazy_env import lazy_env
+from authority.util.lazy_env import declare_secret, lazy_env
 from typing import Dict, List
 
+_GITHUB_API_TOKEN = declare_secret(
+    "GITHUB_API_TOKEN", "authority-contribution-scraper-github-api-token"
+)
+
 if typing.TYPE_CHECKING:
     import collections.abc
     from requests.structures import CaseInsensitiveDict
@@ -32,12 +35,7 @@ class GithubPullRequests(AuthoritySource):
     def __init__(self, sink: "Sink"):
         super().__init__(sink)
         self.session = requests.Session()
-        self.token = lazy_env(
-            key="GITHUB_API_TOKEN",
-            default=lambda: SecretManager().get_secret(
-                "authority-contribution-scraper-github-api-token"
-            ),
-        )
+        self.token = lazy_env(key=_GITHUB_API_TOKEN)
 
     @property
     def name(self) -> str:
@@ -5,19 +5,21 @@ import logging
 import re
 import typing
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List
 
-import gcloud_config_helper
-import google
 import pytz
-from google.cloud import firestore
+from google.api_core.retry import Retry
 
 from authority.model.contribution import Contribution
 from authority.sources.base_ import AuthoritySource
 from authority.sink import Sink
+from authority.util import clients
+from authority.util.concurrency import ordered_map
 
 if typing.TYPE_CHECKING:
     import collections.abc
+
+    from google.cloud import firestore
     from authority.sink import Sink
 
 
@@ -56,14 +58,17 @@ class XkeSource(AuthoritySource):
     XKE scraper implementation
     """
 
-    def __init__(self, sink: "Sink"):
+    #: the only session fields read, all others are left out of the query projection
+    _SESSION_FIELDS = ["startTime", "presenter", "title", "slug"]
+
+    def __init__(self, sink: "Sink", max_workers: int = 8):
+        """
+        :param Sink sink: Sink to retrieve the latest entry from
+        :param int max_workers: The maximum number of events read concurrently
+        """
         super().__init__(sink)
-        if gcloud_config_helper.on_path():
-            credentials, project = gcloud_config_helper.default()
-        else:
-            logging.info("using application default credentials")
-            credentials, project = google.auth.default()
-        self.xke_db = firestore.Client(credentials=credentials, project="xke-nxt")
+        self.max_workers = max_workers
+        self.xke_db = clients.firestore_client("xke-nxt")
 
     @property
     def name(self):
@@ -73,6 +78,13 @@ class XkeSource(AuthoritySource):
     def _contribution_type(self) -> str:
         return "xke"
 
+    @property
+    def contribution_type(self) -> str:
+        """
+        The type of the contributions of XKE sessions
+        """
+        return self._contribution_type
+
     @classmethod
     def scraper_id(cls) -> str:
         return "xke.xebia.com"
@@ -94,20 +106,16 @@ class XkeSource(AuthoritySource):
                 latest.replace(hour=0, minute=0, second=0, microsecond=0),
             )
             .order_by("startTime")
+            .select(["startTime"])
         )
 
-        for event in events.stream():
+        for event, sessions in ordered_map(
+            self._get_sessions, events.stream(retry=Retry()), self.max_workers
+        ):
             contributions: list["Contribution"] = []
-            for session in (
-                self.xke_db.collection("events")
-                .document(event.id)
-                .collection("sessions-public")
-                .stream()
-            ):
-                for contribution in self._create_contribution_from_xke_document(
-                    event=event,
-                    session=session,
-                    contribution_type=self._contribution_type,
+            for session in sessions:
+                for contribution in self.create_contributions(
+                    event=event, session=session
                 ):
                     contributions.append(contribution)
 
@@ -117,12 +125,36 @@ class XkeSource(AuthoritySource):
                 if latest < contribution.date < now:
                     yield contribution
 
-    def _create_contribution_from_xke_document(
+    def _get_sessions(
+        self, event: "firestore.DocumentSnapshot"
+    ) -> tuple["firestore.DocumentSnapshot", list["firestore.DocumentSnapshot"]]:
+        """
+        Reads the public sessions of an event
+        """
+        sessions = list(
+            self.xke_db.collection("events")
+            .document(event.id)
+            .collection("sessions-public")
+            .select(self._SESSION_FIELDS)
+            .stream(retry=Retry())
+        )
+        return event, sessions
+
+    def create_contributions(
         self,
-        event: "firestore.DocumentSnapshot",
+        event: "firestore.DocumentSnapshot | firestore.DocumentReference",
         session: "firestore.DocumentSnapshot",
-        contribution_type: str,
-    ) -> "collections.abc.Generator[Optional[Contribution], None, None]":
+    ) -> "collections.abc.Generator[Contribution, None, None]":
+        """
+        Creates a contribution for each presenter of a public XKE session. Protected
+        sessions and sessions without a start time, presenter or title yield nothing.
+
+        :param firestore.DocumentSnapshot event: The event of the session
+        :param firestore.DocumentSnapshot session: The session
+
+        :return: The contributions of the session
+        :rtype: :obj:`Generator <collections.abc.Generator>`
+        """
 
         if session.id.endswith('-protected'):
             return None
@@ -155,7 +187,7 @@ class XkeSource(AuthoritySource):
                 date=start_time,
                 url=url,
                 scraper_id=self.scraper_id(),
-                type=contribution_type,
+                type=self.contribution_type,
             )
 
 
@@ -1,50 +1,79 @@
 """
 Module containing the Blog source class
 """
+import collections
 import dataclasses
+import json
 import logging
+import math
+import os
 import typing
-from datetime import datetime
+from datetime import datetime, timedelta
 from dateutil.parser import isoparse
 import pytz
-import pyyoutube
-
 
 from authority.model.contribution import Contribution
 from authority.sources.base_ import AuthoritySource
-from authority.util.google_secrets import SecretManager
-from authority.util.lazy_env import lazy_env
+from authority.state import StateStore
+from authority.util.concurrency import ordered_map
+from authority.util.lazy_env import declare_secret, lazy_env
+from authority.util.youtube_quota import QuotaExceeded, QuotaTrackingApi
 
 if typing.TYPE_CHECKING:
     import collections.abc
 
+    import pyyoutube
+
+_YOUTUBE_API_KEY = declare_secret(
+    "YOUTUBE_API_KEY", "authority-contribution-scraper-youtube-api-key"
+)
+
+
 @dataclasses.dataclass
 class Channel:
     username: str
     author: str
     channel_id: str
 
+    @property
+    def uploads_playlist_id(self) -> str:
+        """
+        The id of the playlist with all uploads of the channel. It is derived from the
+        channel id, which saves a channels.list call per channel per run.
+        """
+        return "UU" + self.channel_id.removeprefix("UC")
+
 _channels = [Channel("@martinperez9665", "Martín Pérez Rodríguez", "UC0-IFu7XWoeT-QehlXxNmiw")]
 
 
 class YoutubeChannel(AuthoritySource):
     """
-    youtube channel scraper implementation
+    youtube channel scraper implementation. The channels are read from the
+    `YOUTUBE_CHANNELS` environment variable, a JSON list of objects with the
+    fields of :obj:`Channel`.
+
+    The daily YouTube Data API quota (`YOUTUBE_DAILY_QUOTA`, default 10000 units) is
+    spread over the remaining hourly runs of the quota day. Every run refreshes the
+    least recently refreshed channels first, until its share of the quota is spent;
+    the other channels are refreshed by the next runs.
     """
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(self, *args, max_workers: int = 4, **kwargs) -> None:
         super().__init__(*args, **kwargs)
-        self.current_channel: typing.Optional[Channel] = None
-        self._api_key = lazy_env(
-                    key="YOUTUBE_API_KEY",
-                    default=lambda: SecretManager().get_secret(
-                        "authority-contribution-scraper-youtube-api-key"
-                    ),
-                )
+        self.max_workers = max_workers
+        self.daily_quota = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+        self.state = StateStore(self.sink.client)
+        self._api: typing.Optional[QuotaTrackingApi] = None
+        self._refreshed: dict[str, str] = {}
+        self._api_key = lazy_env(key=_YOUTUBE_API_KEY)
+        channels = lazy_env(key="YOUTUBE_CHANNELS", default=None)
+        self.channels = (
+            [Channel(**channel) for channel in json.loads(channels)] if channels else _channels
+        )
 
 
     @property
     def name(self) -> str:
-        return f"youtube.com/{self.current_channel.username}" if self.current_channel else "youtube.com"
+        return "youtube.com"
 
     @classmethod
     def scraper_id(cls) -> str:
@@ -54,47 +83,119 @@ class YoutubeChannel(AuthoritySource):
     def _contribution_type(self) -> str:
         return "blog"
 
-    def _get_latest_entry(self, username: str) -> datetime:
+    @staticmethod
+    def _channel_scraper_id(channel: Channel) -> str:
+        return f"youtube.com/{channel.username}"
+
+    def _get_latest_entry(self, channel: Channel) -> datetime:
         return self.sink.latest_entry(
-            type=self._contribution_type, scraper_id=self.name
+            type=self._contribution_type, scraper_id=self._channel_scraper_id(channel)
         )
 
+    @staticmethod
+    def _quota_key() -> str:
+        """
+        The state key of today's quota usage, the quota resets at midnight Pacific Time
+        """
+        today = datetime.now(tz=pytz.timezone("America/Los_Angeles")).date()
+        return f"youtube/quota/{today.isoformat()}"
+
+    def _run_budget(self, used_today: int) -> int:
+        """
+        Returns the share of the remaining daily quota for this run, assuming hourly runs
+        """
+        now = datetime.now(tz=pytz.timezone("America/Los_Angeles"))
+        midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        runs_left = max(1, math.ceil((midnight - now) / timedelta(hours=1)))
+        return max(0, self.daily_quota - used_today) // runs_left
+
     @property
     def _feed(self) -> "collections.abc.Generator[Contribution, None, None]":
-        api = pyyoutube.Api(api_key=self._api_key)
+        import pyyoutube
 
-        for self.current_channel in _channels:
-            latest = self._get_latest_entry(self.current_channel.username)
-            logging.info(
-                "reading new vlogs from https://%s since %s", self.name, latest
-            )
-            now = datetime.now().astimezone(pytz.utc)
-
-            channel_info = api.get_channel_info(channel_id=self.current_channel.channel_id)
-
-            playlist_id = channel_info.items[0].contentDetails.relatedPlaylists.uploads
+        state = self.state.get_all(prefix="youtube/")
+        used_today = sum(state.get(self._quota_key(), {}).values())
+        self._api = QuotaTrackingApi(
+            pyyoutube.Api(api_key=self._api_key), budget=self._run_budget(used_today)
+        )
+        self._refreshed = {}
+        logging.info(
+            "%d of %d YouTube quota units used today, budget for this run is %d",
+            used_today, self.daily_quota, self._api.budget,
+        )
 
-            page_token = None
-            uploads_playlist_items = api.get_playlist_items(
-                playlist_id=playlist_id, count=50, limit=50, page_token=page_token
-            )
+        channels = sorted(
+            self.channels,
+            key=lambda channel: state.get(f"youtube/refreshed/{channel.channel_id}", ""),
+        )
+        for contributions in ordered_map(self._get_uploads, channels, self.max_workers):
+            yield from contributions
+
+    def commit(self):
+        """
+        Stores the quota units spent and the channels refreshed
+        """
+        if not self._api:
+            return
+        key = self._quota_key()
+        usage = collections.Counter(self.state.get(key, {}))
+        usage.update(self._api.usage)
+        self.state.put({key: dict(usage), **self._refreshed})
+        self._api = None
+
+    def _get_uploads(self, channel: Channel) -> list[Contribution]:
+        """
+        Reads the uploads of the channel since the latest entry, newest first, until the
+        first page that reaches the latest entry.
+        """
+        latest = self._get_latest_entry(channel)
+        logging.info(
+            "reading new vlogs from https://%s since %s", self._channel_scraper_id(channel), latest
+        )
+        now = datetime.now().astimezone(pytz.utc)
+
+        contributions = []
+        page_token = None
+        while True:
+            try:
+                uploads_playlist_items = self._api.get_playlist_items(
+                    playlist_id=channel.uploads_playlist_id, count=50, limit=50, page_token=page_token
+                )
+            except QuotaExceeded as exception:
+                logging.info(
+                    "postponing refresh of %s, %s", self._channel_scraper_id(channel), exception
+                )
+                return []
 
+            reached_latest = False
             for item in uploads_playlist_items.items:
+                if not item.contentDetails.videoPublishedAt:
+                    continue
                 published_at = isoparse(item.contentDetails.videoPublishedAt)
-                if latest < published_at < now:
-                    yield from self._process_vlog_entry(item, published_at)
+                if published_at <= latest:
+                    reached_latest = True
+                elif published_at < now:
+                    contributions.extend(self._process_vlog_entry(channel, item, published_at))
+
+            page_token = uploads_playlist_items.nextPageToken
+            if reached_latest or not page_token:
+                break
+
+        self._refreshed[f"youtube/refreshed/{channel.channel_id}"] = now.isoformat()
+        contributions.sort(key=lambda contribution: contribution.date)
+        return contributions
 
-    def _process_vlog_entry(self, entry: pyyoutube.PlaylistItem, published_date: datetime) -> "collections.abc.Generator[Contribution, None, None]":
+    def _process_vlog_entry(self, channel: Channel, entry: "pyyoutube.PlaylistItem", published_date: datetime) -> "collections.abc.Generator[Contribution, None, None]":
 
 
             url = f"https://www.youtube.com/watch?v=" + entry.contentDetails.videoId
             yield Contribution(
                 guid=url,
-                author=self.current_channel.author,
+                author=channel.author,
                 date=published_date,
                 title=entry.snippet.title,
                 url=url,
-                scraper_id=self.name,
+                scraper_id=self._channel_scraper_id(channel),
                 type=self._contribution_type,
             )
 
@@ -0,0 +1,103 @@
+"""
+Module containing the StateStore class
+"""
+import json
+import logging
+import typing
+from datetime import datetime
+
+import pytz
+from google.cloud import bigquery, exceptions
+from google.cloud.bigquery import SchemaField
+
+Schema = [
+    SchemaField("key", "STRING", mode="REQUIRED"),
+    SchemaField("value", "STRING", mode="NULLABLE"),
+    SchemaField("updated_at", "TIMESTAMP", mode="REQUIRED"),
+]
+
+
+class StateStore:
+    """
+    Key/value store in BigQuery for state that is kept between runs, like cursors and
+    watermarks. Values are stored as JSON in an append-only table; the most recently
+    written value of a key wins.
+    """
+
+    def __init__(
+        self, client: bigquery.Client, table_name: str = "authority.scraper_state"
+    ):
+        """
+        :param bigquery.Client client: The BigQuery client to use
+        :param str table_name: The name of the table to store the state in
+        """
+        self.client = client
+        self._table_ref = f"{self.client.project}.{table_name}"
+        self.table = self._create_table_if_not_exists()
+
+    def _create_table_if_not_exists(self) -> bigquery.Table:
+        """
+        Create a BigQuery table if it doesn't exist
+        """
+        table = self.client.create_table(
+            table=bigquery.Table(table_ref=self._table_ref, schema=Schema),
+            exists_ok=True,
+        )
+        logging.info("table %s already exists.", table.full_table_id)
+        return table
+
+    def get_all(self, prefix: str) -> dict[str, typing.Any]:
+        """
+        returns the current value of all keys starting with `prefix`
+
+        :param str prefix: The prefix of the keys to return
+
+        :return: The current values by key
+        :rtype: :obj:`dict`
+        """
+        job = self.client.query(
+            query=f"SELECT key, ARRAY_AGG(value ORDER BY updated_at DESC LIMIT 1)[OFFSET(0)] AS value "
+            f"FROM `{self._table_ref}` "
+            f"WHERE STARTS_WITH(key, @prefix) "
+            f"GROUP BY key",
+            job_config=bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ScalarQueryParameter("prefix", "STRING", prefix)
+                ]
+            ),
+        )
+        return {
+            row.get("key"): json.loads(row.get("value")) if row.get("value") else None
+            for row in job.result()
+        }
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        """
+        returns the current value of `key`, or `default` if it was never set
+
+        :param str key: The key of the value to return
+        :param typing.Any default: The value to return if `key` was never set
+        """
+        value = self.get_all(prefix=key).get(key)
+        return default if value is None else value
+
+    def put(self, values: dict[str, typing.Any]):
+        """
+        stores new values for the specified keys
+
+        :param dict values: The values to store by key, must be JSON serializable
+        """
+        if not values:
+            return
+        now = datetime.now(tz=pytz.utc)
+        rows = [(key, json.dumps(value), now) for key, value in values.items()]
+        try:
+            logging.info(f"insert {len(rows)} state values into {self._table_ref}")
+            result = self.client.insert_rows(table=self.table, rows=rows)
+
+            if result:
+                logging.error("failed to store state\n%s", "\n".join(map(str, result)))
+                raise Exception("failed to store state")
+        except exceptions.BadRequest as exception:
+            if exception.errors[0].get("message") != "No rows present in the request.":
+                raise exception
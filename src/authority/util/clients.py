@@ -0,0 +1,122 @@
+"""
+Module containing the process-wide registry of Google credentials and API clients
+"""
+import logging
+import threading
+import typing
+
+if typing.TYPE_CHECKING:
+    import google.auth.credentials
+    from google.cloud import bigquery, firestore
+    from google.cloud.secretmanager_v1 import SecretManagerServiceClient
+
+    from authority.state import StateStore
+
+_T = typing.TypeVar("_T")
+
+_credentials: dict[str, tuple["google.auth.credentials.Credentials", str]] = {}
+_clients: dict[tuple[str, str, str], typing.Any] = {}
+_lock = threading.RLock()
+
+
+def credentials(
+    configuration_name: str = "",
+) -> tuple["google.auth.credentials.Credentials", str]:
+    """
+    Returns the credentials and the default project, resolved once per process. The
+    credentials of the gcloud configuration `configuration_name` are used when gcloud is
+    installed, the application default credentials otherwise.
+
+    :param str configuration_name: Name of the gcloud configuration, defaults to the
+     active configuration
+
+    :return: The credentials and the default project
+    :rtype: :obj:`tuple`
+    """
+    with _lock:
+        if configuration_name not in _credentials:
+            import gcloud_config_helper
+            import google.auth
+
+            if gcloud_config_helper.on_path() and not configuration_name:
+                _credentials[configuration_name] = gcloud_config_helper.default()
+            elif gcloud_config_helper.on_path():
+                credential = gcloud_config_helper.GCloudCredentials(configuration_name)
+                _credentials[configuration_name] = (credential, credential.project)
+            else:
+                logging.info("using application default credentials")
+                _credentials[configuration_name] = google.auth.default()
+        return _credentials[configuration_name]
+
+
+def _client(
+    service: str,
+    project: typing.Optional[str],
+    configuration_name: str,
+    factory: "typing.Callable[[google.auth.credentials.Credentials, str], _T]",
+) -> _T:
+    """
+    Returns the client of `service` for `project`, created by `factory` on first use
+    """
+    with _lock:
+        credential, default_project = credentials(configuration_name)
+        key = (service, project or default_project, configuration_name)
+        if key not in _clients:
+            _clients[key] = factory(credential, key[1])
+        return _clients[key]
+
+
+def bigquery_client(project: typing.Optional[str] = None) -> "bigquery.Client":
+    """
+    Returns the BigQuery client of `project`, which defaults to the project of the
+    credentials. The client is shared by all threads of the process.
+    """
+
+    def create(credential, project_id: str) -> "bigquery.Client":
+        from google.cloud import bigquery
+
+        return bigquery.Client(credentials=credential, project=project_id)
+
+    return _client("bigquery", project, "", create)
+
+
+def firestore_client(project: typing.Optional[str] = None) -> "firestore.Client":
+    """
+    Returns the Firestore client of `project`, which defaults to the project of the
+    credentials. The client is shared by all threads of the process.
+    """
+
+    def create(credential, project_id: str) -> "firestore.Client":
+        from google.cloud import firestore
+
+        return firestore.Client(credentials=credential, project=project_id)
+
+    return _client("firestore", project, "", create)
+
+
+def secret_manager_client(configuration_name: str = "") -> "SecretManagerServiceClient":
+    """
+    Returns the Secret Manager client for the credentials of the gcloud configuration
+    `configuration_name`. The client is shared by all threads of the process.
+    """
+
+    def create(credential, _: str) -> "SecretManagerServiceClient":
+        from google.cloud.secretmanager_v1 import SecretManagerServiceClient
+
+        return SecretManagerServiceClient(credentials=credential)
+
+    return _client("secretmanager", None, configuration_name, create)
+
+
+def state_store(project: typing.Optional[str] = None) -> "StateStore":
+    """
+    Returns the :obj:`StateStore` of `project`, which defaults to the project of the
+    credentials. Its table is created once, so every later use only queries it.
+    """
+
+    def create(_, project_id: str) -> "StateStore":
+        from authority.state import StateStore
+
+        return StateStore(bigquery_client(project_id))
+
+    return _client("state", project, "", create)
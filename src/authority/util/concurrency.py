@@ -0,0 +1,45 @@
+"""
+Module containing helpers for running blocking I/O concurrently
+"""
+import collections
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+_T = typing.TypeVar("_T")
+_R = typing.TypeVar("_R")
+
+
+def ordered_map(
+    function: "collections.abc.Callable[[_T], _R]",
+    iterable: "collections.abc.Iterable[_T]",
+    max_workers: int = 8,
+) -> "collections.abc.Generator[_R, None, None]":
+    """
+    Applies `function` to the items of `iterable` on a pool of threads and yields the
+    results in the order of the input. In contrast to :meth:`Executor.map
+    <concurrent.futures.Executor.map>` the input is consumed lazily: at most twice
+    `max_workers` items are in flight, so an unbounded or slow input is never read ahead
+    completely.
+
+    :param collections.abc.Callable function: The function to apply to every item
+    :param collections.abc.Iterable iterable: The items to apply the function to
+    :param int max_workers: The maximum number of concurrent calls of `function`
+
+    :return: A generator of the results, in input order
+    :rtype: :obj:`collections.abc.Generator`
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: collections.deque[Future] = collections.deque()
+        try:
+            for item in iterable:
+                pending.append(executor.submit(function, item))
+                if len(pending) >= 2 * max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
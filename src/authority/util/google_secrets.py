@@ -3,15 +3,19 @@ Module containing a helper for retrieving Google Secret Manager secrets
 """
 import dataclasses
 import logging
+import os
 import re
+import threading
+import time
 import typing
 
-import gcloud_config_helper
-import google.auth
-from google.cloud.secretmanager_v1 import SecretManagerServiceClient
-
+from authority.util import clients
+from authority.util.concurrency import ordered_map
 from authority.util.singleton import Singleton
 
+if typing.TYPE_CHECKING:
+    import collections.abc
+
 
 @dataclasses.dataclass
 class _SecretName:
@@ -91,33 +95,56 @@ class _SecretName:
 
 class SecretManager(metaclass=Singleton):
     """
-    Wrapper for the Google Secret Manager
+    Wrapper for the Google Secret Manager. Secrets read are cached for `SECRET_TTL`
+    seconds (default 3600).
     """
 
     def __init__(self, configuration_name: str = ""):
         """
         :param str configuration_name: Name of the gcloud configuration to use for credentials
         """
-        if gcloud_config_helper.on_path():
-            self.credentials = gcloud_config_helper.GCloudCredentials(
-                configuration_name
-            )
-            self.project_id = self.credentials.project
-        else:
-            logging.info("using application default credentials")
-            self.credentials, self.project_id = google.auth.default()
-
-        self.client = SecretManagerServiceClient(credentials=self.credentials)
+        self.credentials, self.project_id = clients.credentials(configuration_name)
+        self.client = clients.secret_manager_client(configuration_name)
+        self.ttl = float(os.getenv("SECRET_TTL", "3600"))
+        self._cache: dict[str, tuple[float, str]] = {}
+        self._cache_lock = threading.Lock()
 
     def get_secret(self, name: str) -> str:
         """
-        returns the data of the secret version `name`.
+        returns the data of the secret version `name`, from the cache if it was read
+        less than :attr:`ttl` seconds ago.
 
         :param str name: Name of the secret to find
 
         :return: The data of the secret
         :rtype: :obj:`str`
         """
-        secret_name = _SecretName.parse(name=name, project_id=self.project_id)
-        response = self.client.access_secret_version(name=str(secret_name))
-        return response.payload.data.decode("utf-8")
+        secret_name = str(_SecretName.parse(name=name, project_id=self.project_id))
+        with self._cache_lock:
+            expires, value = self._cache.get(secret_name, (0.0, None))
+        if time.monotonic() < expires:
+            return value
+
+        response = self.client.access_secret_version(name=secret_name)
+        value = response.payload.data.decode("utf-8")
+        with self._cache_lock:
+            self._cache[secret_name] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def prefetch(self, names: "collections.abc.Iterable[str]", max_workers: int = 8):
+        """
+        reads the secrets `names` concurrently into the cache. Secrets that fail to be
+        read are logged, the error is raised when they are read with :meth:`get_secret`.
+
+        :param collections.abc.Iterable names: Names of the secrets to read
+        :param int max_workers: The maximum number of secrets read concurrently
+        """
+
+        def read(name: str):
+            try:
+                self.get_secret(name)
+            except Exception as exception:
+                logging.warning("failed to prefetch secret %s, %s", name, exception)
+
+        for _ in ordered_map(read, names, max_workers):
+            pass
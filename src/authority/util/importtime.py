@@ -0,0 +1,108 @@
+"""
+Checks the import time and memory of modules against a budget, using the output of
+`python -X importtime`.
+
+**Use:**
+
+    python -m authority.util.importtime --budget-ms 1500 --forbid matplotlib authority.app
+"""
+import argparse
+import re
+import subprocess
+import sys
+import typing
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+_MEASURE = """
+import resource, sys
+import {module}
+print("maxrss:", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stderr)
+print("modules:", " ".join(sys.modules), file=sys.stderr)
+"""
+
+
+class ImportProfile(typing.NamedTuple):
+    """
+    The cumulative import time in microseconds of the module and of the packages of the
+    modules it imported directly, the maximum resident set size in kilobytes and the
+    names of all modules loaded
+    """
+
+    module: str
+    cumulative_us: int
+    packages_us: dict[str, int]
+    maxrss_kb: int
+    modules: frozenset[str]
+
+
+def profile(module: str) -> ImportProfile:
+    """
+    Imports `module` in a fresh interpreter and returns its import profile
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _MEASURE.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative_us, packages_us, maxrss_kb, modules = 0, {}, 0, frozenset()
+    children: list[tuple[str, int]] = []
+    for line in result.stderr.splitlines():
+        if match := _IMPORT_TIME.match(line):
+            # nested imports are indented by two spaces and listed before their parent
+            cumulative, depth, name = int(match[2]), len(match[3]) // 2, match[4]
+            if depth == 1:
+                children.append((name, cumulative))
+            elif depth == 0 and name != module:
+                children = []
+            elif depth == 0:
+                cumulative_us = cumulative
+                for child, child_us in children:
+                    package = child.split(".")[0]
+                    packages_us[package] = packages_us.get(package, 0) + child_us
+        elif line.startswith("maxrss:"):
+            maxrss_kb = int(line.split()[1])
+        elif line.startswith("modules:"):
+            modules = frozenset(line.split()[1:])
+    return ImportProfile(module, cumulative_us, packages_us, maxrss_kb, modules)
+
+
+def main() -> int:
+    """
+    Prints the import profile of the modules and returns 1 if any exceeds the budget
+    or imports a forbidden module
+    """
+    parser = argparse.ArgumentParser(description="check the import time of modules")
+    parser.add_argument("modules", nargs="+", help="the modules to import")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="the maximum import time")
+    parser.add_argument(
+        "--forbid", default=[], action="append", help="a module that must not be imported"
+    )
+    parser.add_argument("--top", type=int, default=10, help="the number of packages to show")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        result = profile(module)
+        print(
+            f"{module}: {result.cumulative_us / 1000:.0f} ms, "
+            f"{result.maxrss_kb / 1024:.0f} MB max resident"
+        )
+        for package, cumulative_us in sorted(
+            result.packages_us.items(), key=lambda item: item[1], reverse=True
+        )[: args.top]:
+            print(f"  {cumulative_us / 1000:8.1f} ms  {package}")
+
+        if result.cumulative_us / 1000 > args.budget_ms:
+            print(f"  exceeds the budget of {args.budget_ms:.0f} ms")
+            failed = True
+        for forbidden in args.forbid:
+            if forbidden in result.modules:
+                print(f"  imports {forbidden}")
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,45 @@
 """
 Module containing the lazy_env helper for lazily falling back to the default value
 """
+import logging
 import os
 import subprocess
+import threading
+import time
 import typing
 
+from authority.util.concurrency import ordered_map
 from authority.util.google_secrets import SecretManager
 
 if typing.TYPE_CHECKING:
     import collections.abc
 
+#: the names of the Google Secret Manager secrets the environment variables default to
+_declared_secrets: dict[str, str] = {}
+
+_op_cache: dict[str, tuple[float, str]] = {}
+_op_cache_lock = threading.Lock()
+
+
+def declare_secret(key: str, name: str) -> str:
+    """
+    Declares that the environment variable `key` defaults to the Google Secret Manager
+    secret `name`, so that :func:`lazy_env` reads the secret when the variable has not
+    been set and :func:`prefetch_secrets` can read it in advance.
+
+    :param str key: The key of the environment variable
+    :param str name: The name of the secret
+
+    :return: The key of the environment variable
+    :rtype: str
+    """
+    _declared_secrets[key] = name
+    return key
+
 
 def lazy_env(
     key: str,
-    default: "collections.abc.Callable[[], typing.Any] | typing.Any",
+    default: "collections.abc.Callable[[], typing.Any] | typing.Any" = None,
 ) -> typing.Any:
     """
     Retrieves a variable from the environment. When the environment variable has
@@ -21,7 +47,11 @@ def lazy_env(
     environment value is set and starts with op:// or gsm:// it is assumed that it refers
     to an 1password or google secret manager secret, which will be read.
     If default is a callable the result of the call will be returned, if not,
-    default will be returned.
+    default will be returned. Without a default, the secret declared for the key with
+    :func:`declare_secret` is returned.
+
+    Secrets are cached for `SECRET_TTL` seconds, so repeated calls do not read them
+    again.
 
     :param str key: The key of the environment variable to retrieve
     :param collections.abc.Callable | typing.Any default: The default value to use if the
@@ -36,10 +66,63 @@ def lazy_env(
         if value.startswith("gsm://"):
             return SecretManager().get_secret(value.removeprefix("gsm://"))
         elif value.startswith("op://"):
-            return subprocess.check_output(['op', 'read', value],
-                                            text=True).rstrip()
+            return _read_op(value)
         else:
             return value
+    if default is None and key in _declared_secrets:
+        return SecretManager().get_secret(_declared_secrets[key])
     if callable(default):
         return default()
     return default
+
+
+def _read_op(reference: str) -> str:
+    """
+    Returns the 1password secret `reference`, from the cache if it was read less than
+    `SECRET_TTL` seconds ago
+    """
+    with _op_cache_lock:
+        expires, value = _op_cache.get(reference, (0.0, None))
+    if time.monotonic() < expires:
+        return value
+
+    value = subprocess.check_output(['op', 'read', reference], text=True).rstrip()
+    with _op_cache_lock:
+        _op_cache[reference] = (
+            time.monotonic() + float(os.getenv("SECRET_TTL", "3600")),
+            value,
+        )
+    return value
+
+
+def prefetch_secrets(
+    keys: "typing.Optional[collections.abc.Iterable[str]]" = None, max_workers: int = 8
+):
+    """
+    Reads the secrets of the environment variables `keys` concurrently into the cache,
+    so that :func:`lazy_env` returns them without delay. Defaults to all declared
+    secrets. Secrets that fail to be read are logged and read again on use.
+
+    :param collections.abc.Iterable keys: The keys of the environment variables
+    :param int max_workers: The maximum number of secrets read concurrently
+    """
+    secret_names, op_references = [], []
+    for key in list(_declared_secrets) if keys is None else keys:
+        value = os.getenv(key, "")
+        if value.startswith("gsm://"):
+            secret_names.append(value.removeprefix("gsm://"))
+        elif value.startswith("op://"):
+            op_references.append(value)
+        elif not value and key in _declared_secrets:
+            secret_names.append(_declared_secrets[key])
+
+    def read_op(reference: str):
+        try:
+            _read_op(reference)
+        except Exception as exception:
+            logging.warning("failed to prefetch secret %s, %s", reference, exception)
+
+    for _ in ordered_map(read_op, op_references, max_workers):
+        pass
+    if secret_names:
+        SecretManager().prefetch(secret_names, max_workers)
@@ -0,0 +1,188 @@
+"""
+Module containing the NameIndex, for resolving variants of person names locally
+"""
+import collections
+import re
+import typing
+import unicodedata
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+_T = typing.TypeVar("_T")
+
+#: abbreviations of name particles, as used in presenter strings
+_ABBREVIATIONS = {"vd": "van de", "vdr": "van der", "v": "van"}
+
+#: name particles, ignored by the phonetic key
+_PARTICLES = frozenset(
+    ("van", "de", "der", "den", "het", "t", "ter", "ten", "te", "von", "la", "le", "du", "da", "di", "del")
+)
+
+#: spelling variants that sound alike, applied in order by the phonetic key
+_PHONETIC_REPLACEMENTS = (
+    ("ij", "y"),
+    ("ei", "y"),
+    ("ph", "f"),
+    ("th", "t"),
+    ("dt", "t"),
+    ("ck", "k"),
+    ("gh", "g"),
+    ("ch", "g"),
+    ("oe", "u"),
+    ("ou", "au"),
+    ("c", "k"),
+    ("q", "k"),
+    ("z", "s"),
+    ("v", "f"),
+    ("w", "f"),
+)
+
+
+def normalize_name(name: str) -> str:
+    """
+    Returns the name without accents, punctuation, text between brackets and abbreviated
+    particles, in lower case
+
+    **Use:**
+
+        >>> normalize_name("Martín Pérez-Rodríguez (Xebia)")
+        'martin perez rodriguez'
+        >>> normalize_name("Jan vd Berg")
+        'jan van de berg'
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r"\([^)]*\)", " ", name.casefold())
+    name = re.sub(r"[^\w\s]|_", " ", name)
+    return " ".join(_ABBREVIATIONS.get(token, token) for token in name.split())
+
+
+def _phonetic_token(token: str) -> str:
+    for spelling, sound in _PHONETIC_REPLACEMENTS:
+        token = token.replace(spelling, sound)
+    if token.endswith("d"):
+        token = token[:-1] + "t"
+    return re.sub(r"(.)\1+", r"\1", token)
+
+
+def phonetic_key(name: str) -> str:
+    """
+    Returns a key that is equal for names that sound alike, ignoring particles and the
+    order of the name parts
+
+    **Use:**
+
+        >>> phonetic_key("Mark van Holsteyn") == phonetic_key("Mark van Holsteijn")
+        True
+    """
+    tokens = [t for t in normalize_name(name).split() if t not in _PARTICLES]
+    return " ".join(sorted(_phonetic_token(token) for token in tokens))
+
+
+def edit_distance(a: str, b: str, maximum: int) -> int:
+    """
+    Returns the Levenshtein distance between `a` and `b`, or `maximum + 1` if it exceeds
+    `maximum`
+
+    **Use:**
+
+        >>> edit_distance("jansen", "janssen", 2)
+        1
+        >>> edit_distance("jansen", "pietersen", 2)
+        3
+    """
+    if abs(len(a) - len(b)) > maximum:
+        return maximum + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            )
+        if min(current) > maximum:
+            return maximum + 1
+        previous = current
+    return min(previous[-1], maximum + 1)
+
+
+class NameIndex(typing.Generic[_T]):
+    """
+    Index of values by person name, which resolves variants of the names: differences
+    in case, accents, punctuation, abbreviated particles and the order of the name parts,
+    names that sound alike and, as a last resort, names within a small edit distance of a
+    name with the same last name sound. A lookup that matches different values at the
+    same level is ambiguous and returns nothing.
+
+    Names that sound alike or are within the edit distance only match when their first
+    names are equal, and the edit distance allowed grows with the length of the name:
+    none below 10 characters, one below 20 and `max_distance` from there on.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        """
+        :param int max_distance: The maximum edit distance of a name variant of 20
+         characters or more
+        """
+        self.max_distance = max_distance
+        self._normalized: dict[str, list[_T]] = collections.defaultdict(list)
+        self._tokens: dict[str, list[_T]] = collections.defaultdict(list)
+        self._phonetic: dict[str, list[tuple[str, _T]]] = collections.defaultdict(list)
+        self._blocks: dict[str, list[tuple[str, _T]]] = collections.defaultdict(list)
+
+    def add(self, name: str, value: _T):
+        """
+        Adds the value under `name` to the index
+        """
+        if not (normalized := normalize_name(name)):
+            return
+        self._normalized[normalized].append(value)
+        self._tokens[" ".join(sorted(normalized.split()))].append(value)
+        self._phonetic[phonetic_key(name)].append((normalized.split()[0], value))
+        self._blocks[_phonetic_token(normalized.split()[-1])].append((normalized, value))
+
+    def update(self, names: "collections.abc.Iterable[tuple[str, _T]]"):
+        """
+        Adds the values under their names to the index
+        """
+        for name, value in names:
+            self.add(name, value)
+
+    def lookup(self, name: str) -> typing.Optional[_T]:
+        """
+        Returns the value of the closest unambiguous match of `name`, if any
+        """
+        if not (normalized := normalize_name(name)):
+            return None
+        for candidates in (
+            self._normalized.get(normalized),
+            self._tokens.get(" ".join(sorted(normalized.split()))),
+        ):
+            if candidates:
+                return self._unambiguous(candidates)
+
+        first_name = normalized.split()[0]
+        if candidates := [
+            value
+            for candidate_first_name, value in self._phonetic.get(phonetic_key(name), [])
+            if candidate_first_name == first_name
+        ]:
+            return self._unambiguous(candidates)
+
+        max_distance = min(self.max_distance, len(normalized) // 10)
+        if not max_distance:
+            return None
+        shortlist: dict[int, list[_T]] = collections.defaultdict(list)
+        for candidate, value in self._blocks.get(_phonetic_token(normalized.split()[-1]), []):
+            if candidate.split()[0] != first_name:
+                continue
+            distance = edit_distance(normalized, candidate, max_distance)
+            if distance <= max_distance:
+                shortlist[distance].append(value)
+        return self._unambiguous(shortlist[min(shortlist)]) if shortlist else None
+
+    @staticmethod
+    def _unambiguous(candidates: list[_T]) -> typing.Optional[_T]:
+        first = candidates[0]
+        return first if all(candidate == first for candidate in candidates) else None
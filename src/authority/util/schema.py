@@ -0,0 +1,34 @@
+"""
+Module containing helper methods for evolving BigQuery table schemas
+"""
+import logging
+
+from google.cloud import bigquery
+
+
+def add_missing_columns(
+    client: bigquery.Client, table: bigquery.Table, schema: list[bigquery.SchemaField]
+) -> bigquery.Table:
+    """
+    Adds the columns of `schema` that the table does not have yet. New columns are
+    appended, so rows inserted as tuples in the order of `schema` keep matching.
+
+    :param bigquery.Client client: The BigQuery client to use
+    :param bigquery.Table table: The table to evolve
+    :param list schema: The desired schema of the table
+
+    :return: The table with the added columns
+    :rtype: :obj:`Table <bigquery:google.cloud.bigquery.table.Table>`
+    """
+    existing = {field.name for field in table.schema}
+    missing = [field for field in schema if field.name not in existing]
+    if not missing:
+        return table
+
+    logging.info(
+        "adding columns %s to %s",
+        ", ".join(field.name for field in missing),
+        table.full_table_id,
+    )
+    table.schema = list(table.schema) + missing
+    return client.update_table(table, ["schema"])
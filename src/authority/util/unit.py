@@ -3,9 +3,15 @@ Module containing helper method for retrieving a unit from a user
 """
 import functools
 import logging
+import typing
 
+from authority.directory import UserDirectory
 from authority.model.user import User
 from authority.ms_graph_api import MSGraphAPI
+from authority.util.name_index import NameIndex
+
+if typing.TYPE_CHECKING:
+    import collections.abc
 
 
 @functools.lru_cache(maxsize=None)
@@ -26,11 +32,45 @@ def _map_user_to_unit(user: User) -> str:
     return _unit_lookup(unit) if unit else "other"
 
 
-def get_unit_by_display_name(ms_graph_api: MSGraphAPI, name: str) -> str:
+def build_unit_index(
+    directory: UserDirectory,
+    contributors: "collections.abc.Iterable[tuple[str, str]]" = (),
+) -> NameIndex[str]:
+    """
+    Returns an index of units by the names of the users in the directory and the
+    names of the contributors, to resolve variants of their names locally
+
+    :param UserDirectory directory: The directory with the users to index
+    :param collections.abc.Iterable contributors: The names and units of known contributors
+    """
+    index: NameIndex[str] = NameIndex()
+    index.update(
+        (user.display_name, _map_user_to_unit(user))
+        for user in directory.users
+        if user.display_name
+    )
+    index.update(contributors)
+    return index
+
+
+def get_unit_by_display_name(
+    ms_graph_api: MSGraphAPI,
+    name: str,
+    directory: typing.Optional[UserDirectory] = None,
+    index: typing.Optional[NameIndex[str]] = None,
+) -> str:
+    """
+    Returns the unit of the user `name`, looked up in the local user directory first,
+    then in the name `index` and finally with MS Graph. Defaults to "other"
+    """
     unit = None
 
-    ms_user = ms_graph_api.get_user_by_display_name(display_name=name)
-    if ms_user:
+    directory = directory if directory else UserDirectory.get_instance()
+    if ms_user := directory.get_user_by_display_name(name):
+        unit = _map_user_to_unit(user=ms_user)
+    elif index and (unit := index.lookup(name)):
+        logging.debug("resolved unit of %s from the name index", name)
+    elif ms_user := ms_graph_api.get_user_by_display_name(display_name=name):
         unit = _map_user_to_unit(user=ms_user)
 
     if not unit:
@@ -40,3 +80,41 @@ def get_unit_by_display_name(ms_graph_api: MSGraphAPI, name: str) -> str:
         unit = "other"
 
     return unit
+
+
+def get_units_by_display_names(
+    ms_graph_api: MSGraphAPI,
+    names: "collections.abc.Iterable[str]",
+    directory: typing.Optional[UserDirectory] = None,
+    index: typing.Optional[NameIndex[str]] = None,
+) -> dict[str, str]:
+    """
+    Returns the unit of each of the `names`, looked up in the local user directory
+    first, then in the name `index` and finally with MS Graph in batches. Defaults
+    to "other". Names that MS Graph kept throttling are left out.
+    """
+    directory = directory if directory else UserDirectory.get_instance()
+    ms_users = {name: directory.get_user_by_display_name(name) for name in names}
+    units = {
+        name: _map_user_to_unit(user=ms_user)
+        for name, ms_user in ms_users.items()
+        if ms_user
+    }
+    if index:
+        units.update(
+            (name, unit)
+            for name in ms_users
+            if name not in units and (unit := index.lookup(name))
+        )
+    ms_users = ms_graph_api.get_users_by_display_name(
+        name for name in ms_users if name not in units
+    )
+
+    for name, ms_user in ms_users.items():
+        units[name] = _map_user_to_unit(user=ms_user) if ms_user else None
+        if not units[name]:
+            logging.info(
+                'Could not determine unit for user %s, defaulting to "other"', name
+            )
+            units[name] = "other"
+    return units
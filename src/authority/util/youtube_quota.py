@@ -0,0 +1,73 @@
+"""
+Module containing the quota accounting wrapper for the YouTube Data API
+"""
+import collections
+import threading
+import typing
+
+if typing.TYPE_CHECKING:
+    import pyyoutube
+
+#: the quota cost in units of the YouTube Data API calls, all other calls cost 1 unit
+_COSTS = {
+    "search_by_keywords": 100,
+    "search_by_developer": 100,
+    "search_by_mine": 100,
+    "search_by_related_video": 100,
+    "search": 100,
+}
+
+
+class QuotaExceeded(Exception):
+    """
+    Raised when a call would exceed the quota budget
+    """
+
+
+class QuotaTrackingApi:
+    """
+    Wrapper for :obj:`pyyoutube.Api` that counts the quota units spent per call type and
+    refuses calls that would exceed the budget. Calls with a `count` larger than a page
+    fetch several pages, but are accounted as one; callers page explicitly instead.
+    """
+
+    def __init__(self, api: "pyyoutube.Api", budget: int):
+        """
+        :param pyyoutube.Api api: The API to wrap
+        :param int budget: The maximum number of quota units to spend
+        """
+        self._api = api
+        self.budget = budget
+        self.usage: collections.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def used(self) -> int:
+        """
+        The number of quota units spent
+        """
+        return sum(self.usage.values())
+
+    def spend(self, call_type: str, units: int):
+        """
+        Accounts for `units` quota units spent on `call_type`
+
+        :raises: :obj:`QuotaExceeded` when the budget does not allow it
+        """
+        with self._lock:
+            if self.used + units > self.budget:
+                raise QuotaExceeded(
+                    f"{call_type} needs {units} units, {self.budget - self.used} of {self.budget} left"
+                )
+            self.usage[call_type] += units
+
+    def __getattr__(self, name: str) -> typing.Any:
+        attribute = getattr(self._api, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            self.spend(name, _COSTS.get(name, 1))
+            return attribute(*args, **kwargs)
+
+        return call
@@ -5,7 +5,9 @@ resource "google_cloud_run_service" "authority-contribution-scraper" {
   template {
     metadata {
       annotations = {
-        "autoscaling.knative.dev/maxScale" = 1
+        "autoscaling.knative.dev/maxScale"        = 1
+        "run.googleapis.com/cpu-throttling"        = "false"
+        "run.googleapis.com/execution-environment" = "gen2"
       }
       labels = {
         "run.googleapis.com/startupProbeType" = "Default"
@@ -22,11 +24,28 @@ resource "google_cloud_run_service" "authority-contribution-scraper" {
             memory = "1024Mi"
           }
         }
+        env {
+          name  = "USER_DIRECTORY_PATH"
+          value = "/mnt/user-directory/directory.json.gz"
+        }
+        volume_mounts {
+          name       = "user-directory"
+          mount_path = "/mnt/user-directory"
+        }
+      }
+      volumes {
+        name = "user-directory"
+        csi {
+          driver = "gcsfuse.run.googleapis.com"
+          volume_attributes = {
+            bucketName = google_storage_bucket.user-directory.name
+          }
+        }
       }
     }
   }
   project    = data.google_project.current.project_id
-  provider   = google
+  provider   = google-beta
   depends_on = [google_project_service.run]
   timeouts {
     create = "10m"
@@ -34,6 +53,19 @@ resource "google_cloud_run_service" "authority-contribution-scraper" {
   autogenerate_revision_name = true
 }
 
+resource "google_storage_bucket" "user-directory" {
+  name                        = "${data.google_project.current.project_id}-authority-user-directory"
+  location                    = var.region
+  uniform_bucket_level_access = true
+  project                     = data.google_project.current.project_id
+}
+
+resource "google_storage_bucket_iam_member" "user-directory" {
+  bucket = google_storage_bucket.user-directory.name
+  role   = "roles/storage.objectUser"
+  member = format("serviceAccount:%s", google_service_account.authority-contribution-scraper.email)
+}
+
 resource "google_service_account" "authority-contribution-scraper-invoker" {
   account_id   = "authority-cntrbtn-scrpr-invkr"
   display_name = "Authority Contribution scraper invoker"
@@ -68,6 +100,24 @@ resource "google_cloud_scheduler_job" "authority-contribution-scraper" {
   depends_on = [google_project_iam_member.cloudscheduler_iam_service_account_user]
 }
 
+resource "google_cloud_scheduler_job" "authority-contribution-reconciler" {
+  name             = "authority-contribution-reconciler"
+  description      = "Authority Contribution contributors reconciliation"
+  schedule         = "31 3 * * *"
+  time_zone        = "Europe/Amsterdam"
+  attempt_deadline = "320s"
+  region           = "europe-west1"
+
+  http_target {
+    http_method = "GET"
+    uri         = format("%s/reconcile", google_cloud_run_service.authority-contribution-scraper.status[0].url)
+    oidc_token {
+      service_account_email = google_service_account.authority-contribution-scraper-invoker.email
+    }
+  }
+  depends_on = [google_project_iam_member.cloudscheduler_iam_service_account_user]
+}
+
 resource "google_service_account" "authority-contribution-scraper" {
   display_name = "binx.io authority contribution scraper"
   account_id   = "authority-contribution-scraper"